@@ -1,20 +1,44 @@
 # atualizar_oea.py  — orquestrador verboso com logs por etapa (UTF-8 fix)
+# Por padrão roda as etapas no próprio processo (importa o script e chama main()), com uma única
+# credencial e sessões HTTP reaproveitadas (oea_clientes.share) e as mesmas cotas (oea_api).
+# --subprocess (ou OEA_MODO=subprocess) volta a abrir um interpretador novo por etapa/tentativa.
+# As etapas formam um grafo (STEPS): cada uma começa assim que as dependências terminam, e as
+# independentes rodam em paralelo, cada qual com suas tentativas e seu log. --sequencial desliga.
+# Cada execução tem um id (OEA_EXECUCAO) que as etapas usam no journal de retomada (oea_estado):
+# a nova tentativa de uma etapa que caiu no meio continua dos blocos já gravados.
+# Cada chamada às APIs vai para logs/telemetria_<execução>.jsonl (oea_telemetria); no fim sai a
+# tabela por etapa/endpoint e a comparação com o histórico das execuções anteriores.
+import contextvars
+import importlib
+import io
 import os
 import subprocess
 import sys
+import threading
 import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 
-SCRIPTS = [
-    "obras_compilar_csv.py",
-    "replicar_esteira_oea.py",
-    "replicar_bd_mensal.py",
-]
+from oea_estado import RUN_ENV, STEP
+
+# etapa -> etapas que precisam ter terminado com sucesso antes dela (a ordem aqui é a do modo
+# sequencial e a de desempate quando várias ficam prontas juntas)
+STEPS = {
+    "obras_compilar_csv.py": [],
+    "replicar_esteira_oea.py": [],                        # BD_Carteira -> Base_Esteira: independente
+    "replicar_bd_mensal.py": ["obras_compilar_csv.py"],   # lê o Historico_Mensal.csv recém-publicado
+}
+MAX_PARALLEL_STEPS = int(os.environ.get("OEA_ETAPAS_PARALELAS", "2"))  # 1 = sequencial
 
 RETRIES_PER_STEP = 3
 BASE_SLEEP = 5  # segundos
 
+# "inprocess": sem custo de interpretador/imports/token/TLS por etapa | "subprocess": isolamento total
+RUN_MODE = os.environ.get("OEA_MODO", "inprocess")
+CAMINHO_CRED = "credenciais.json"
+
 PYTHON_EXE_CANDIDATES = [
     sys.executable,
     str(Path("venv/Scripts/python.exe")),
@@ -36,7 +60,9 @@ LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
 
 def find_python():
-    for exe in PYTHON_EXE_CANDIDATES:
+    if sys.executable and Path(sys.executable).exists():
+        return sys.executable  # o próprio interpretador: nada a testar
+    for exe in PYTHON_EXE_CANDIDATES[1:]:
         try:
             subprocess.run([exe, "--version"], capture_output=True, check=True)
             return exe
@@ -49,15 +75,115 @@ def tail_text(text: str, n_lines: int = 80) -> str:
     lines = text.splitlines()
     return "\n".join(lines[-n_lines:]) if len(lines) > n_lines else text
 
-def run_step(python_exe: str, script_path: str) -> None:
+class StepOutput(io.TextIOBase):
+    """
+    sys.stdout/sys.stderr do orquestrador: tudo vai para o console e, se quem escreveu roda no
+    contexto de uma etapa in-process, também para o log dela. Log, prefixo e etapa da telemetria
+    são ContextVars: threads criadas pela etapa (leitura em paralelo, pool de downloads) os herdam
+    quando a etapa as inicia com contextvars.copy_context().run.
+    Com etapas em paralelo, cada linha do console ganha o prefixo da etapa ("[esteira] ...");
+    o log continua sem prefixo.
+    """
+
+    def __init__(self, console):
+        self.console = console
+        self.lock = threading.Lock()
+        self.partial = {}  # thread -> pedaço de linha ainda sem "\n" (só com prefixo)
+
+    def write(self, text: str) -> int:
+        me = threading.current_thread()
+        log = _step_log.get()
+        prefix = _step_prefix.get()
+        with self.lock:
+            if prefix:
+                # print() escreve o texto e o "\n" em chamadas separadas: junta a linha antes
+                # de prefixar, para as etapas não se misturarem no meio de uma linha
+                *lines, rest = (self.partial.pop(me, "") + text).split("\n")
+                for line in lines:
+                    self.console.write(f"{prefix}{line}\n")
+                if rest:
+                    self.partial[me] = rest
+            else:
+                self.console.write(text)
+            if log is not None:
+                try:
+                    log.write(text)
+                except ValueError:
+                    pass  # thread da etapa que sobreviveu a ela: o log já foi fechado
+        return len(text)
+
+    def flush(self) -> None:
+        me = threading.current_thread()
+        with self.lock:
+            rest = self.partial.pop(me, "")
+            if rest:
+                self.console.write(f"{_step_prefix.get()}{rest}\n")
+        self.console.flush()
+
+
+_step_log = contextvars.ContextVar("oea_log", default=None)
+_step_prefix = contextvars.ContextVar("oea_prefix", default="")
+
+
+def install_step_output() -> None:
+    if isinstance(sys.stdout, StepOutput):
+        return
+    sys.stdout = StepOutput(sys.stdout)
+    sys.stderr = StepOutput(sys.stderr)
+
+
+def run_inprocess(script_path: str, lf) -> int:
+    """Importa o script (uma vez) e chama main() aqui; saída capturada por StepOutput."""
+    token = _step_log.set(lf)
+    try:
+        importlib.import_module(Path(script_path).stem).main()
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdout.flush()
+        _step_log.reset(token)
+
+
+def run_subprocess(python_exe: str, script_path: str, lf) -> int:
+    cmd = [python_exe, "-u", "-X", "utf8", script_path]  # filho em UTF-8
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",          # <<< DECODIFICA UTF-8
+            errors="replace",          # <<< NÃO QUEBRA se vier lixo
+            env=ENV,
+        )
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            print(line.rstrip())
+            lf.write(line)
+        return proc.wait()
+    except Exception as e:
+        lf.write(f"===== EXCEPTION: {e} =====\n")
+        return 1
+
+
+def run_step(script_path: str, python_exe: str = "") -> None:
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file = LOG_DIR / f"{Path(script_path).stem}_{ts}.log"
-    cmd = [python_exe, "-u", "-X", "utf8", script_path]  # filho em UTF-8
 
     print(f"\n{LINE}\n▶️  Rodando: {script_path}")
-    print(f"   • Python: {python_exe}")
-    print(f"   • CWD   : {Path.cwd()}")
-    print(f"   • CMD   : {' '.join(cmd)}")
+    if python_exe:
+        print(f"   • Python: {python_exe}")
+        print(f"   • CWD   : {Path.cwd()}")
+        print(f"   • CMD   : {python_exe} -u -X utf8 {script_path}")
+    else:
+        print("   • Modo  : in-process (main() com clientes compartilhados)")
     print(f"   • Log   : {log_file}")
 
     for attempt in range(1, RETRIES_PER_STEP + 1):
@@ -66,25 +192,11 @@ def run_step(python_exe: str, script_path: str) -> None:
         with open(log_file, "a", encoding="utf-8", newline="") as lf:
             lf.write(f"\n===== {datetime.now():%Y-%m-%d %H:%M:%S} :: START {script_path} =====\n")
             lf.flush()
-            try:
-                proc = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    encoding="utf-8",          # <<< DECODIFICA UTF-8
-                    errors="replace",          # <<< NÃO QUEBRA se vier lixo
-                    env=ENV,
-                )
-                assert proc.stdout is not None
-                for line in proc.stdout:
-                    print(line.rstrip())
-                    lf.write(line)
-                rc = proc.wait()
-                lf.write(f"===== END (rc={rc}) =====\n")
-            except Exception as e:
-                lf.write(f"===== EXCEPTION: {e} =====\n")
-                rc = 1
+            if python_exe:
+                rc = run_subprocess(python_exe, script_path, lf)
+            else:
+                rc = run_inprocess(script_path, lf)
+            lf.write(f"===== END (rc={rc}) =====\n")
 
         elapsed = time.time() - start
         if rc == 0:
@@ -111,21 +223,121 @@ def run_step(python_exe: str, script_path: str) -> None:
         else:
             raise SystemExit(1)
 
+def step_name(script_path: str) -> str:
+    """Rótulo curto do console: replicar_esteira_oea.py -> esteira."""
+    stem = Path(script_path).stem
+    for affix in ("replicar_", "_oea", "_csv"):
+        stem = stem.replace(affix, "")
+    return stem
+
+def run_graph(steps: dict, python_exe: str, max_parallel: int) -> dict:
+    """
+    Roda as etapas respeitando as dependências, até max_parallel ao mesmo tempo. Etapa que falha
+    (depois das tentativas do run_step) não derruba as outras; só as que dependem dela são puladas.
+    Devolve {etapa: ("ok" | "falhou" | "pulada", segundos)}.
+    """
+    unknown = {d for deps in steps.values() for d in deps if d not in steps}
+    if unknown:
+        raise ValueError(f"Dependências sem etapa declarada: {', '.join(sorted(unknown))}")
+
+    parallel = max_parallel > 1
+    results = {}
+    pending = list(steps)
+
+    def worker(script: str):
+        # roda numa cópia do contexto (ver submit): prefixo e etapa não vazam para a próxima
+        # etapa que reaproveitar esta thread do pool
+        _step_prefix.set(f"[{step_name(script)}] " if parallel else "")
+        STEP.set(Path(script).stem)  # etapa dos registros de telemetria (modo in-process)
+        start = time.time()
+        try:
+            run_step(script, python_exe)
+            return "ok", time.time() - start
+        except SystemExit:
+            return "falhou", time.time() - start
+        except Exception:
+            traceback.print_exc()
+            return "falhou", time.time() - start
+        finally:
+            sys.stdout.flush()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="etapa") as pool:
+        running = {}
+        while pending or running:
+            for script in list(pending):
+                deps = steps[script]
+                if any(results.get(d, ("",))[0] in ("falhou", "pulada") for d in deps):
+                    pending.remove(script)
+                    results[script] = ("pulada", 0.0)
+                    print(f"⏭️  {script} pulada: dependência falhou ({', '.join(deps)}).")
+                elif all(results.get(d, ("",))[0] == "ok" for d in deps) and len(running) < max(1, max_parallel):
+                    pending.remove(script)
+                    running[pool.submit(contextvars.copy_context().run, worker, script)] = script
+            if not running:
+                if pending:  # ciclo no grafo: ninguém nunca fica pronto
+                    raise ValueError(f"Dependências circulares entre: {', '.join(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                results[running.pop(fut)] = fut.result()
+    return {script: results[script] for script in steps}
+
 def main():
     print(LINE)
     print(f"{BANNER} — {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(LINE)
 
-    python_exe = find_python()
+    mode = RUN_MODE
+    if "--subprocess" in sys.argv[1:]:
+        mode = "subprocess"
+    elif "--inprocess" in sys.argv[1:]:
+        mode = "inprocess"
+    max_parallel = 1 if "--sequencial" in sys.argv[1:] else MAX_PARALLEL_STEPS
+
+    # id da execução: as tentativas de uma etapa dividem o journal; outra execução começa do zero
+    run_id = os.environ.setdefault(RUN_ENV, f"{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}")
+    ENV[RUN_ENV] = run_id
+    print(f"🆔 Execução: {run_id}")
 
-    missing = [s for s in SCRIPTS if not Path(s).exists()]
+    missing = [s for s in STEPS if not Path(s).exists()]
     if missing:
         print("❌ Arquivos não encontrados:", ", ".join(missing))
         sys.exit(1)
 
-    for script in SCRIPTS:
-        run_step(python_exe, script)
+    install_step_output()  # prefixo por etapa no console (e, in-process, o log de cada uma)
+    python_exe = ""
+    if mode == "subprocess":
+        python_exe = find_python()
+    else:
+        import oea_clientes
+        try:
+            oea_clientes.share(CAMINHO_CRED)
+            print("🔐 Credencial compartilhada entre as etapas (in-process).")
+        except Exception as e:
+            print(f"⚠️  Não foi possível carregar {CAMINHO_CRED} ({e}); cada etapa autentica sozinha.")
+
+    if max_parallel > 1:
+        print(f"🔀 Até {max_parallel} etapas em paralelo, respeitando as dependências.")
+    start = time.time()
+    results = run_graph(STEPS, python_exe, max_parallel)
+    total = time.time() - start
 
+    if mode != "subprocess":
+        from oea_api import SCHEDULER
+        print(f"\n📊 Cotas (todas as etapas): {SCHEDULER.summary()}")
+
+    print(f"\n{LINE}")
+    for script, (status, secs) in results.items():
+        icon = {"ok": "✅", "falhou": "❌", "pulada": "⏭️ "}[status]
+        print(f"{icon} {script:<28} {status:<7} {secs:7.1f}s")
+    print(f"⏱️  Tempo total: {total:.1f}s (soma das etapas: {sum(s for _, s in results.values()):.1f}s)")
+
+    from oea_telemetria import report
+    report(run_id, results, total)
+
+    if any(status != "ok" for status, _ in results.values()):
+        print(f"\n❌ Pipeline terminou com falhas. ({datetime.now().strftime('%H:%M:%S')})")
+        sys.exit(1)
     print(f"\n🎉 Pipeline concluído com sucesso! ({datetime.now().strftime('%H:%M:%S')})")
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark do motor de conversão por coluna (oea_conversoes).
+
+Mede, numa coluna grande com valores repetidos (como no Historico_Mensal), convert_column
+(valores distintos uma vez, regex + NumPy) contra a regra por célula convert_value. A
+equivalência entre os dois fica em tests/test_conversoes.py.
+
+Uso:
+    python benchmarks/bench_conversoes.py [linhas]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import oea_conversoes as conv  # noqa: E402
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    rng = np.random.default_rng(42)
+    days = pd.date_range("2020-01-01", "2025-12-31").strftime("%d/%m/%Y").to_numpy()
+    dates = pd.Series(rng.choice(days, n_rows), dtype=object)
+    amounts = pd.Series([f"{x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                         for x in rng.choice(rng.random(20_000) * 1e6, n_rows)], dtype=object)
+    print(f"⏱️  Coluna de {n_rows:,} linhas ({dates.nunique():,} datas / {amounts.nunique():,} valores distintos)")
+    for kind, col in (("date", dates), ("num", amounts)):
+        _, t_old = timed(lambda: [conv.convert_value(v, kind) for v in col])
+        _, t_new = timed(conv.convert_column, col, kind)
+        print(f"   • {kind:4}: por célula {t_old:7.2f}s | por coluna {t_new:6.2f}s  (x{t_old / t_new:.0f})")
+
+
+if __name__ == "__main__":
+    main()
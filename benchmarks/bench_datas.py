@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark do motor de datas do obras_compilar_csv (sem acesso ao Drive).
+
+Gera um histórico sintético (N linhas espalhadas em arquivos MM-YYYY, coluna A em dd/mm/aaaa)
+e compara:
+  - antigo: pd.to_datetime sem formato por arquivo + de novo no concat + loop de groupby
+  - novo  : parse_dates (formato detectado, valores distintos uma vez) + select_last_date_rows
+
+Uso:
+    python benchmarks/bench_datas.py [linhas] [arquivos]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import obras_compilar_csv as occ  # noqa: E402
+
+
+def make_history(n_rows: int, n_files: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    per_file = n_rows // n_files
+    dfs = []
+    for i in range(n_files):
+        month = pd.Timestamp(2020, 1, 1) + pd.DateOffset(months=i)
+        days = pd.date_range(month, month + pd.offsets.MonthEnd(0)).strftime("%d/%m/%Y").to_numpy()
+        df = pd.DataFrame({
+            "Data": rng.choice(days, per_file),
+            "Obra": rng.integers(0, 5000, per_file).astype(str),
+            "Valor": rng.random(per_file).round(2).astype(str),
+        })
+        df["__ARQUIVO_ORIGEM__"] = month.strftime("%m-%Y")
+        df["__FILE_ID__"] = f"id{i}"
+        dfs.append(df)
+    return dfs
+
+
+def old_engine(dfs):
+    parsed = []
+    for df in dfs:
+        df = df.copy()
+        df["__DATA_COL_A__"] = pd.to_datetime(df[df.columns[0]], dayfirst=True, errors="coerce")
+        parsed.append(df)
+    daily = pd.concat(parsed, ignore_index=True)
+    daily["__DATA_COL_A__"] = pd.to_datetime(daily[daily.columns[0]], dayfirst=True, errors="coerce")
+    parts = []
+    for _, grupo in daily.groupby("__ARQUIVO_ORIGEM__", dropna=False):
+        max_date = grupo["__DATA_COL_A__"].max()
+        if pd.isna(max_date):
+            continue
+        parts.append(grupo[grupo["__DATA_COL_A__"] == max_date])
+    return daily, pd.concat(parts, ignore_index=True)
+
+
+def new_engine(dfs):
+    parsed = [occ.ensure_first_col_datetime(df.copy()) for df in dfs]
+    return occ.build_daily_and_monthly(parsed)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000_000
+    n_files = int(sys.argv[2]) if len(sys.argv) > 2 else 36
+    print(f"🧪 Histórico sintético: {n_rows:,} linhas em {n_files} arquivos")
+    dfs = make_history(n_rows, n_files)
+
+    (daily_old, monthly_old), t_old = timed(old_engine, dfs)
+    (daily_new, monthly_new), t_new = timed(new_engine, dfs)
+
+    same = (daily_old["__DATA_COL_A__"].equals(daily_new["__DATA_COL_A__"])
+            and monthly_old.drop(columns="__DATA_COL_A__").equals(monthly_new.drop(columns="__DATA_COL_A__")))
+    print(f"   • antigo: {t_old:8.2f}s")
+    print(f"   • novo  : {t_new:8.2f}s  (x{t_old / t_new:.1f})")
+    print(f"   • resultado idêntico: {'sim' if same else 'NÃO'}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da replicação BD_Carteira ➜ Base_Esteira: caminho cliente x modo servidor.
+
+Precisa de credenciais (credenciais.json) e de uma planilha de rascunho com acesso de edição
+para a conta de serviço. Para cada tamanho, cria nela uma aba de origem sintética (cabeçalho na
+linha 3, A:AN com textos, números e datas seriais) e uma de destino, e mede:
+  - cliente : leitura em janelas (thread produtora) + escrita pelo ValuesBatchWriter
+  - servidor: sheets.copyTo + copyPaste PASTE_VALUES + exclusão da cópia (replicate_server_side)
+Confere que os dois destinos ficaram iguais e apaga as abas no fim.
+
+Uso:
+    python benchmarks/bench_esteira_servidor.py <id_planilha_rascunho> [linhas ...]
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import replicar_esteira_oea as rep  # noqa: E402
+from oea_api import api_call  # noqa: E402
+from oea_sheets import ValuesBatchWriter  # noqa: E402
+
+N_COLS = 40  # A:AN
+SIZES = [1_000, 10_000, 50_000]
+
+
+def synthetic_rows(n_rows: int, seed: int = 42):
+    rng = random.Random(seed)
+    header = [f"Coluna {j + 1}" for j in range(N_COLS)]
+    rows = []
+    for _ in range(n_rows):
+        rows.append([
+            rng.choice([f"OBRA-{rng.randint(1, 5000)}", "", "Em andamento", "Concluída"]) if j % 3 == 0
+            else round(rng.random() * 1e5, 2) if j % 3 == 1
+            else rng.randint(43000, 46000)  # data serial
+            for j in range(N_COLS)
+        ])
+    return header, rows
+
+
+def fresh_sheet(sh, title: str, rows: int):
+    try:
+        sh.del_worksheet(sh.worksheet(title))
+    except Exception:
+        pass
+    return sh.add_worksheet(title=title, rows=rows, cols=N_COLS)
+
+
+def client_copy(sheet_id: str, ws_src, sh_dst, ws_dst) -> int:
+    header = rep.get_values(ws_src, f"A3:{rep.COL_FIM}3", "cabeçalho")[0]
+
+    def windows():
+        ws = rep.auth().open_by_key(sheet_id).worksheet(ws_src.title)
+        return rep.read_windows(ws, ws_src.row_count)
+
+    n = 0
+    with ValuesBatchWriter(sh_dst, value_input_option="RAW", call=api_call) as writer:
+        writer.add(ws_dst.title, "A2", [header])
+        for batch in rep.data_batches(rep.prefetch(windows, rep.PIPELINE_DEPTH), len(header)):
+            writer.add_rows(ws_dst.title, 3 + n, 1, batch)
+            n += len(batch)
+    return n
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    sheet_id = sys.argv[1]
+    sizes = [int(x) for x in sys.argv[2:]] or SIZES
+
+    gc = rep.auth()
+    sh = gc.open_by_key(sheet_id)
+    print(f"📂 Planilha de rascunho: {sh.title}")
+    for n_rows in sizes:
+        header, rows = synthetic_rows(n_rows)
+        ws_src = fresh_sheet(sh, "bench_origem", n_rows + 3)
+        ws_cli = fresh_sheet(sh, "bench_cliente", n_rows + 3)
+        ws_srv = fresh_sheet(sh, "bench_servidor", n_rows + 3)
+        with ValuesBatchWriter(sh, value_input_option="RAW", call=api_call) as w:
+            w.add(ws_src.title, "A3", [header])
+            w.add_rows(ws_src.title, 4, 1, rows)
+
+        n_cli, t_cli = timed(client_copy, sheet_id, ws_src, sh, ws_cli)
+        n_srv, t_srv = timed(rep.replicate_server_side, ws_src, sh, ws_srv, N_COLS, "bench")
+        same = ws_cli.get_values("A2:AN") == ws_srv.get_values("A2:AN")
+        print(f"   • {n_rows:>7,} linhas: cliente {t_cli:7.2f}s ({n_cli:,}) | servidor {t_srv:6.2f}s"
+              f" ({n_srv:,}) | x{t_cli / t_srv:.1f} | destinos iguais: {same}")
+
+    for title in ("bench_origem", "bench_cliente", "bench_servidor"):
+        sh.del_worksheet(sh.worksheet(title))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,14 +11,34 @@ import io
 import re
 import sys
 import csv
-from typing import List, Tuple, Optional
+import time
+import gzip
+import importlib.util
+import contextvars
+import json
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 import pandas as pd
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-from googleapiclient.errors import HttpError
-import gspread
+from googleapiclient.http import MediaIoBaseUpload
+
+from oea_api import DRIVE, READ, SCHEDULER, api_call
+from oea_clientes import credentials, drive_service, gspread_client
+from oea_conversoes import column_kind, typed_column
+from oea_csv import read_csv_bytes
+from oea_drive import DriveFolder, SHORTCUT_MIME, download
+
+# Parquet (cache local e sidecar tipado) é opcional: sem pyarrow, ambos ficam desligados
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except Exception:
+    HAS_PARQUET = False
 
 # ============== CONFIG ==============
 FOLDER_ID = "1108v_R_-KpYXclfUPaXsRqzsyQ0tiMjh"
@@ -30,11 +50,55 @@ GOOGLE_SHEET_TAB_NAME: Optional[str] = None
 OUTPUT_DAILY_NAME = "Historico_Diario.csv"
 OUTPUT_MONTHLY_NAME = "Historico_Mensal.csv"
 
+# Artefatos extras ao lado dos CSVs:
+# - Parquet tipado do mensal (datas/números reais, ver oea_conversoes.py), lido pelo replicar_bd_mensal
+# - CSV gzip (opcional) do diário e do mensal, para downloads menores
+OUTPUT_MONTHLY_PARQUET_NAME = "Historico_Mensal.parquet"
+PUBLISH_PARQUET = True
+PUBLISH_GZIP = False
+GZIP_SUFFIX = ".gz"
+
 # CSV de saída: separador ';' e BOM para abrir bonito no Excel
 CSV_SEPARATOR = ";"
 CSV_ENCODING = "utf-8-sig"   # adiciona BOM
 CSV_LINE_TERMINATOR = "\n"   # Excel aceita bem \n
 CSV_QUOTING = csv.QUOTE_MINIMAL
+
+# Streaming: cada mês é anexado ao Historico_Diario.csv assim que lido, e só as linhas da
+# última data ficam em memória (pico ~ um mês, não o histórico inteiro). Saída idêntica.
+STREAMING_BUILD = True
+
+# Modo compacto (opt-in): texto em string[pyarrow], categorias nas colunas repetitivas e nas
+# de proveniência (__ARQUIVO_ORIGEM__/__FILE_ID__), inteiros reduzidos. CSV de saída idêntico.
+COMPACT_MODE = False
+CATEGORY_MAX_RATIO = 0.5  # vira categoria se (valores distintos / linhas) <= isso
+PROVENANCE_COLS = ("__ARQUIVO_ORIGEM__", "__FILE_ID__")
+
+# Publicação: CSV montado em buffer (memória até SPOOL_MAX_BYTES, depois arquivo temporário)
+# e enviado sobre o arquivo existente (files.update, mesmo ID). Acima de RESUMABLE_MIN_BYTES
+# o upload é resumível, em blocos; falha transiente recomeça o upload (update no lugar é idempotente).
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+RESUMABLE_MIN_BYTES = 5 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024  # múltiplo de 256 KiB
+
+# Leitores de Excel (.xlsx/.xls), em ordem de preferência; cai para o próximo se o motor não
+# estiver instalado ou falhar. Sempre só a primeira aba (área usada).
+#   calamine -> python-calamine (Rust), bem mais rápido
+#   openpyxl -> modo read_only (streaming), padrão do pandas para .xlsx
+#   None     -> motor padrão do pandas para a extensão (ex.: xlrd em .xls)
+EXCEL_ENGINES: Tuple[Optional[str], ...] = ("calamine", "openpyxl", None)
+EXCEL_ENGINE_MODULES = {"calamine": "python_calamine", "openpyxl": "openpyxl"}
+
+# Leitura concorrente dos arquivos MM-YYYY (1 = sequencial).
+# Cada worker usa seus próprios clientes Drive/gspread (googleapiclient não é thread-safe).
+COMPILE_WORKERS = 4
+
+# Cache local dos meses já lidos (Parquet por file id), invalidado quando a revisão do
+# arquivo no Drive muda; acima de CACHE_MAX_BYTES os menos usados recentemente saem.
+CACHE_ENABLED = True
+CACHE_DIR = Path(".cache/compilar")
+CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1 GiB
+CACHE_SCHEMA = 3  # incrementar quando mudar o formato do DataFrame cacheado ou a leitura dos CSVs
 # ====================================
 
 SCOPES = [
@@ -47,89 +111,116 @@ MONTH_FILE_REGEX = re.compile(r"^\s*\d{2}-\d{4}\s*(?:\.[A-Za-z0-9]+)?\s*$")
 
 
 def auth_clients():
-    creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    drive = build("drive", "v3", credentials=creds, cache_discovery=False)
-    gc = gspread.authorize(creds)
-    gc.set_timeout(60)  # falha rapido em call travada
-    return drive, gc
+    creds = credentials(SERVICE_ACCOUNT_FILE, SCOPES)
+    return drive_service(creds), gspread_client(creds)
+
 
+REVISION_FIELDS = "modifiedTime, md5Checksum, version"
 
-def list_month_files(drive) -> List[Tuple[str, str, str]]:
-    page_token = None
+
+def file_revision(meta: dict) -> str:
+    """Identificador da revisão de um arquivo do Drive (muda a cada alteração de conteúdo)."""
+    return f"v{meta.get('version', '')}|{meta.get('md5Checksum') or meta.get('modifiedTime', '')}"
+
+
+def list_month_files(folder: DriveFolder) -> List[Tuple[str, str, str, str]]:
+    """Lista os arquivos MM-YYYY da pasta como (nome, file_id, mime, revisão)."""
     results = []
-    all_names_debug = []
-
-    while True:
-        resp = drive.files().list(
-            q=f"'{FOLDER_ID}' in parents and trashed = false",
-            fields=("nextPageToken, files(id, name, mimeType, "
-                    "shortcutDetails(targetId, targetMimeType))"),
-            pageSize=1000,
-            pageToken=page_token,
-            supportsAllDrives=True,
-            includeItemsFromAllDrives=True,
-            corpora="allDrives",
-        ).execute()
-
-        for f in resp.get("files", []):
-            name = (f.get("name") or "").strip()
-            all_names_debug.append(name)
-            mime = f.get("mimeType")
-            fid = f.get("id")
-
-            # Resolve atalhos
-            if mime == "application/vnd.google-apps.shortcut":
-                sd = f.get("shortcutDetails") or {}
-                target_id = sd.get("targetId")
-                target_mime = sd.get("targetMimeType")
-                if target_id and target_mime:
-                    fid = target_id
-                    mime = target_mime
-
-            if MONTH_FILE_REGEX.match(name):
-                results.append((name, fid, mime))
-
-        page_token = resp.get("nextPageToken")
-        if not page_token:
-            break
-
-    print(f"📝 {len(all_names_debug)} arquivos na pasta; {len(results)} casaram com MM-YYYY:")
-    for nm, _, _ in sorted(results):
+    shortcut_targets = {}
+
+    for f in folder.files:
+        name = (f.get("name") or "").strip()
+        if not MONTH_FILE_REGEX.match(name):
+            continue
+        mime = f.get("mimeType")
+        fid = f.get("id")
+
+        # Resolve atalhos (a revisão que importa é a do arquivo alvo, buscada em lote abaixo)
+        if mime == SHORTCUT_MIME:
+            sd = f.get("shortcutDetails") or {}
+            target_id = sd.get("targetId")
+            target_mime = sd.get("targetMimeType")
+            if target_id and target_mime:
+                fid = target_id
+                mime = target_mime
+                shortcut_targets[len(results)] = target_id
+
+        results.append([name, fid, mime, file_revision(f)])
+
+    if shortcut_targets:
+        metas = folder.get_many(shortcut_targets.values(), fields=f"id, {REVISION_FIELDS}")
+        for pos, target_id in shortcut_targets.items():
+            if target_id in metas:
+                results[pos][3] = file_revision(metas[target_id])
+
+    results = [tuple(r) for r in results]
+    print(f"📝 {len(folder.files)} arquivos na pasta; {len(results)} casaram com MM-YYYY:")
+    for nm, *_ in sorted(results):
         print("   ✓", nm)
     print()
     return results
 
 
+_thread_local = threading.local()
+
+
+def worker_clients():
+    """Clientes (drive, gc) exclusivos da thread atual, criados na primeira chamada."""
+    clients = getattr(_thread_local, "clients", None)
+    if clients is None:
+        clients = auth_clients()
+        _thread_local.clients = clients
+    return clients
+
+
 def download_drive_file_bytes(drive, file_id: str) -> bytes:
     request = drive.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request, chunksize=2 * 1024 * 1024)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
-    return fh.getvalue()
+    return download(request, f"download {file_id}", call=SCHEDULER.caller(DRIVE), chunksize=2 * 1024 * 1024)
 
 
 def export_google_sheet_as_csv(drive, file_id: str) -> bytes:
     request = drive.files().export_media(fileId=file_id, mimeType="text/csv")
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request, chunksize=2 * 1024 * 1024)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
-    return fh.getvalue()
+    return download(request, f"download {file_id}", call=SCHEDULER.caller(DRIVE), chunksize=2 * 1024 * 1024,
+                    endpoint="files.export_media")
 
 
 def read_google_sheet_to_df(gc, file_id: str) -> pd.DataFrame:
-    sh = gc.open_by_key(file_id)
-    ws = sh.worksheet(GOOGLE_SHEET_TAB_NAME) if GOOGLE_SHEET_TAB_NAME else sh.get_worksheet(0)
-    values = ws.get_all_values()
+    sh = api_call(lambda: gc.open_by_key(file_id), f"abertura {file_id}", kind=READ, endpoint="spreadsheets.get")
+    ws = api_call(lambda: sh.worksheet(GOOGLE_SHEET_TAB_NAME) if GOOGLE_SHEET_TAB_NAME else sh.get_worksheet(0),
+                  f"abertura da aba de {file_id}", kind=READ, endpoint="spreadsheets.get")
+    values = api_call(ws.get_all_values, f"leitura {file_id}", kind=READ, endpoint="values.get")
     if not values:
         return pd.DataFrame()
     header, rows = values[0], values[1:]
     return pd.DataFrame(rows, columns=header if header else None)
 
 
+def excel_engine_available(engine: Optional[str]) -> bool:
+    module = EXCEL_ENGINE_MODULES.get(engine)
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def read_excel_first_sheet(content: bytes, name: str) -> pd.DataFrame:
+    """Lê a primeira aba com o primeiro motor de EXCEL_ENGINES que funcionar; loga a vazão."""
+    last_error: Optional[Exception] = None
+    for engine in EXCEL_ENGINES:
+        if not excel_engine_available(engine):
+            continue
+        t0 = time.perf_counter()
+        try:
+            df = pd.read_excel(io.BytesIO(content), sheet_name=0, dtype=str, engine=engine)
+        except Exception as e:
+            print(f"   ⚠️  '{name}': motor {engine or 'padrão'} falhou ({e}); tentando o próximo…")
+            last_error = e
+            continue
+        secs = time.perf_counter() - t0
+        size_mb = len(content) / 1024 / 1024
+        rate = size_mb / secs if secs > 0 else float("inf")
+        print(f"   ↳ Excel '{name}' via {engine or 'padrão'}: {size_mb:.2f} MiB em {secs:.2f}s ({rate:.1f} MiB/s)")
+        return df
+    raise last_error or RuntimeError("nenhum motor de Excel disponível")
+
+
 def load_month_file_to_df(drive, gc, name: str, file_id: str, mime: str) -> pd.DataFrame:
     try:
         if mime == "application/vnd.google-apps.spreadsheet":
@@ -137,20 +228,18 @@ def load_month_file_to_df(drive, gc, name: str, file_id: str, mime: str) -> pd.D
                 df = read_google_sheet_to_df(gc, file_id)
             else:
                 content = export_google_sheet_as_csv(drive, file_id)
-                df = pd.read_csv(io.BytesIO(content), dtype=str)
+                df = read_csv_bytes(content, dtype=str)
         elif mime in (
             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             "application/vnd.ms-excel",
         ):
             content = download_drive_file_bytes(drive, file_id)
-            df = pd.read_excel(io.BytesIO(content), dtype=str)
+            df = read_excel_first_sheet(content, name)
         else:
             # CSV no Drive costuma ser text/csv ou text/plain (às vezes application/octet-stream)
+            # separador/encoding detectados pela amostra; uma única leitura
             content = download_drive_file_bytes(drive, file_id)
-            try:
-                df = pd.read_csv(io.BytesIO(content), dtype=str)
-            except Exception:
-                df = pd.read_csv(io.BytesIO(content), dtype=str, sep=";")
+            df = read_csv_bytes(content, dtype=str)
 
         if df.empty:
             print(f"⚠️  '{name}' vazio.")
@@ -166,101 +255,523 @@ def load_month_file_to_df(drive, gc, name: str, file_id: str, mime: str) -> pd.D
         return pd.DataFrame()
 
 
+# Strings que o pandas ignora ao escolher o "primeiro valor não nulo" para inferir o formato
+_NAT_LIKE = {"", "NaT", "nat", "NAT", "nan", "NaN", "NAN", "now", "today"}
+
+
+def guess_date_format(values) -> Optional[str]:
+    """
+    Formato que pd.to_datetime(..., dayfirst=True) inferiria para `values` (pelo primeiro valor
+    não nulo). None = nenhum valor utilizável; "mixed" = parse elemento a elemento.
+    """
+    for v in values:
+        if isinstance(v, str) and v not in _NAT_LIKE:
+            return pd.tseries.api.guess_datetime_format(v, dayfirst=True) or "mixed"
+        if not (v is None or isinstance(v, str) or pd.isna(v)):
+            return "mixed"
+    return None
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """
+    Converte uma coluna de datas (dia primeiro) numa só passada: o formato é detectado uma
+    vez e cada valor distinto é convertido uma única vez (as datas se repetem muito).
+    Mesmo resultado de pd.to_datetime(values, dayfirst=True, errors="coerce").
+    """
+    codes, uniques = pd.factorize(values)
+    if len(uniques) == 0:
+        return pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    fmt = guess_date_format(uniques)
+    parsed = pd.DatetimeIndex(pd.to_datetime(pd.Series(uniques, dtype=object), dayfirst=True,
+                                             errors="coerce", format=fmt))
+    return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=values.index)
+
+
 def ensure_first_col_datetime(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
     first_col = df.columns[0]  # coluna A é a data
-    df["__DATA_COL_A__"] = pd.to_datetime(df[first_col], dayfirst=True, errors="coerce")
+    df["__DATA_COL_A__"] = parse_dates(df[first_col])
     return df
 
 
+def select_last_date_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Linhas da maior data (__DATA_COL_A__) de cada __ARQUIVO_ORIGEM__, vetorizado.
+    Origens sem nenhuma data válida ficam de fora; saída ordenada por origem (como o groupby).
+    """
+    max_by_origin = (df.groupby("__ARQUIVO_ORIGEM__", sort=False, dropna=False, observed=True)
+                     ["__DATA_COL_A__"].transform("max"))
+    last = df[df["__DATA_COL_A__"].eq(max_by_origin)]
+    # ordem textual da origem mesmo quando a coluna é categórica (COMPACT_MODE)
+    return last.sort_values("__ARQUIVO_ORIGEM__", kind="stable",
+                            key=lambda s: s.astype(object)).reset_index(drop=True)
+
+
 def build_daily_and_monthly(dfs: List[pd.DataFrame]):
     if not dfs:
         return pd.DataFrame(), pd.DataFrame()
 
+    # cada mês já chega com __DATA_COL_A__ (convertida uma vez, na leitura)
     daily_df = pd.concat(dfs, ignore_index=True, copy=False)
-    daily_df = ensure_first_col_datetime(daily_df)
+    if "__DATA_COL_A__" not in daily_df.columns:
+        daily_df = ensure_first_col_datetime(daily_df)
 
     if daily_df.empty or "__ARQUIVO_ORIGEM__" not in daily_df.columns or "__DATA_COL_A__" not in daily_df.columns:
         return daily_df, pd.DataFrame()
 
-    monthly_parts = []
-    for origem, grupo in daily_df.groupby("__ARQUIVO_ORIGEM__", dropna=False):
-        max_date = grupo["__DATA_COL_A__"].max()
-        if pd.isna(max_date):
-            continue
-        monthly_parts.append(grupo[grupo["__DATA_COL_A__"] == max_date])
-
-    monthly_df = pd.concat(monthly_parts, ignore_index=True) if monthly_parts else pd.DataFrame()
+    monthly_df = select_last_date_rows(daily_df)
+    if monthly_df.empty:
+        monthly_df = pd.DataFrame()
     return daily_df, monthly_df
 
 
-def delete_if_exists(drive, filename: str):
-    """Remove arquivos com mesmo nome; robusto para Shared Drives (404/403)."""
-    resp = drive.files().list(
-        q=f"name = '{filename}' and '{FOLDER_ID}' in parents and trashed = false",
-        fields="files(id, name)",
-        pageSize=100,
-        supportsAllDrives=True,
-        includeItemsFromAllDrives=True,
-        corpora="allDrives",
-    ).execute()
+class MonthFileCache:
+    """
+    Cache em disco dos DataFrames já lidos, um Parquet por file id.
+    manifest.json guarda, por file id: chave de revisão, tamanho e último uso (para o LRU).
+    Seguro para uso pelas threads de leitura.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.manifest_path = self.dir / "manifest.json"
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.dir.mkdir(parents=True, exist_ok=True)
+        try:
+            self.entries: Dict[str, dict] = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except Exception:
+            self.entries = {}
+
+    @staticmethod
+    def key(name: str, revision: str) -> str:
+        return f"{CACHE_SCHEMA}|{name}|{revision}"
+
+    def _path(self, file_id: str) -> Path:
+        return self.dir / f"{file_id}.parquet"
+
+    def get(self, file_id: str, key: str) -> Optional[pd.DataFrame]:
+        with self.lock:
+            entry = self.entries.get(file_id)
+            if not entry or entry.get("key") != key:
+                self.misses += 1
+                return None
+        try:
+            df = pd.read_parquet(self._path(file_id))
+        except Exception:
+            with self.lock:
+                self.entries.pop(file_id, None)
+                self.misses += 1
+            return None
+        with self.lock:
+            entry["last_used"] = time.time()
+            self.hits += 1
+        return df
 
-    for f in resp.get("files", []):
-        fid = f["id"]
+    def put(self, file_id: str, key: str, df: pd.DataFrame) -> None:
+        path = self._path(file_id)
         try:
-            # 1) tenta excluir direto
-            drive.files().delete(fileId=fid, supportsAllDrives=True).execute()
-            print(f"🧹 Apagado arquivo antigo: {f['name']} ({fid})")
-        except HttpError as e:
-            status = getattr(e.resp, "status", None)
-            if status in (403, 404):
-                # 2) fallback: mover para lixeira
-                try:
-                    drive.files().update(
-                        fileId=fid,
-                        body={"trashed": True},
-                        supportsAllDrives=True,
-                    ).execute()
-                    print(f"🗑️  Movido para lixeira: {f['name']} ({fid})")
-                except Exception as e2:
-                    # 3) não bloquear fluxo
-                    print(f"⚠️  Não foi possível excluir/lixeirar {f['name']} ({fid}): {e2}")
+            df.to_parquet(path, index=False)
+        except Exception as e:
+            print(f"⚠️  Não foi possível cachear {file_id}: {e}")
+            return
+        with self.lock:
+            self.entries[file_id] = {"key": key, "size": path.stat().st_size, "last_used": time.time()}
+
+    def evict(self, keep_ids=()) -> None:
+        """Remove entradas órfãs (arquivo saiu da pasta) e, por LRU, o que passar de max_bytes."""
+        keep_ids = set(keep_ids)
+        with self.lock:
+            for fid in [f for f in self.entries if keep_ids and f not in keep_ids]:
+                self._drop(fid)
+            total = sum(e["size"] for e in self.entries.values())
+            for fid, entry in sorted(self.entries.items(), key=lambda kv: kv[1]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                total -= entry["size"]
+                self._drop(fid)
+
+    def _drop(self, file_id: str) -> None:
+        self.entries.pop(file_id, None)
+        self._path(file_id).unlink(missing_ok=True)
+
+    def save(self) -> None:
+        with self.lock:
+            tmp = self.manifest_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.entries, indent=1), encoding="utf-8")
+            tmp.replace(self.manifest_path)
+
+
+def open_cache() -> Optional[MonthFileCache]:
+    if not CACHE_ENABLED:
+        return None
+    if not HAS_PARQUET:
+        print("ℹ️  pyarrow indisponível; cache local desativado.")
+        return None
+    return MonthFileCache(CACHE_DIR, CACHE_MAX_BYTES)
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def mib(n_bytes: float) -> str:
+    return f"{n_bytes / 1024 / 1024:.1f} MiB"
+
+
+def peak_rss() -> Optional[int]:
+    """Pico de memória do processo em bytes (None onde não há `resource`, ex.: Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Representação compacta do df: mesmos valores (e mesmo CSV), bem menos objetos Python."""
+    n = len(df)
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if col in PROVENANCE_COLS:
+            out[col] = s.astype("category")
+        elif s.dtype == object:
+            if n and s.nunique(dropna=True) <= CATEGORY_MAX_RATIO * n:
+                out[col] = s.astype("category")
+            elif HAS_PARQUET:
+                out[col] = s.astype("string[pyarrow]")
             else:
-                print(f"⚠️  Erro ao excluir {f['name']} ({fid}): {e}")
+                out[col] = s
+        elif pd.api.types.is_integer_dtype(s):
+            out[col] = pd.to_numeric(s, downcast="integer")
+        else:
+            out[col] = s  # datas e floats ficam como estão (float32 mudaria o texto do CSV)
+    return pd.DataFrame(out, index=df.index)
+
+
+def read_month_file(month_file: Tuple[str, str, str, str], clients=None,
+                    cache: Optional[MonthFileCache] = None):
+    """
+    Lê um arquivo MM-YYYY (download + parse + data da coluna A).
+    Devolve (df, segundos, veio_do_cache, (bytes_antes, bytes_depois) | None); o último só
+    no COMPACT_MODE.
+    """
+    name, fid, mime, revision = month_file
+    t0 = time.perf_counter()
+    key = MonthFileCache.key(name, revision)
+    df = cache.get(fid, key) if cache is not None else None
+    cached = df is not None
+    if not cached:
+        drive, gc = clients or worker_clients()
+        df = load_month_file_to_df(drive, gc, name, fid, mime)
+        if not df.empty:
+            df = ensure_first_col_datetime(df)
+            if cache is not None:
+                cache.put(fid, key, df)
+
+    mem = None
+    if COMPACT_MODE and not df.empty:
+        before = frame_bytes(df)
+        df = compact_frame(df)
+        mem = (before, frame_bytes(df))
+    return df, time.perf_counter() - t0, cached, mem
+
+
+def iter_month_files(drive, gc, month_files: List[Tuple[str, str, str, str]],
+                     workers: int = COMPILE_WORKERS,
+                     cache: Optional[MonthFileCache] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Gera (nome, df) de cada arquivo MM-YYYY na ordem da listagem, já com o log por arquivo.
+    Com workers > 1 lê em paralelo, mas com no máximo `workers` meses adiantados em memória.
+    Meses cuja revisão no Drive não mudou vêm do cache local, sem download.
+    Arquivos vazios ou com erro são pulados.
+    """
+    workers = max(1, min(workers, len(month_files)))
+    if workers == 1:
+        results = (read_month_file(mf, (drive, gc), cache) for mf in month_files)
+        yield from _report_month_files(month_files, results)
+        return
+
+    print(f"⚙️  Lendo {len(month_files)} arquivos com {workers} workers...")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mes") as ex:
+        def results():
+            pending = deque()
+            for mf in month_files:
+                # cada tarefa numa cópia do contexto da etapa (log/prefixo/telemetria do orquestrador)
+                pending.append(ex.submit(contextvars.copy_context().run, read_month_file, mf, None, cache))
+                if len(pending) >= workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        yield from _report_month_files(month_files, results())
+
+
+def _report_month_files(month_files, results) -> Iterator[Tuple[str, pd.DataFrame]]:
+    for (name, _, mime, _), (df, secs, cached, mem) in zip(month_files, results):
+        origem = "cache" if cached else mime
+        print(f"📥 '{name}' ({origem}) — ⏱️ {secs:.2f}s")
+        if df.empty:
+            print(f"   ⚠️  '{name}' sem dados, ignorado.\n")
+            continue
+        if mem:
+            print(f"   🧠 Memória: {mib(mem[0])} → {mib(mem[1])}")
+        if "__DATA_COL_A__" in df.columns and df["__DATA_COL_A__"].notna().any():
+            maxd = df["__DATA_COL_A__"].max()
+            print(f"   ↳ Última data encontrada: {maxd.strftime('%d/%m/%Y')}")
+        print(f"   ✅ Ok ({len(df)} linhas).\n")
+        yield name, df
 
 
-def upload_csv_to_drive(drive, df: pd.DataFrame, filename: str):
-    if df is None or df.empty:
-        print(f"⚠️  '{filename}' está vazio; não será enviado.")
+def close_cache(cache: Optional[MonthFileCache], month_files) -> None:
+    if cache is None:
         return
+    cache.evict(keep_ids=[fid for _, fid, _, _ in month_files])
+    cache.save()
+    print(f"🗃️  Cache: {cache.hits} reaproveitados, {cache.misses} baixados.")
+
 
-    # remove colunas auxiliares antes de salvar
+def load_month_files(drive, gc, month_files: List[Tuple[str, str, str, str]],
+                     workers: int = COMPILE_WORKERS) -> List[pd.DataFrame]:
+    """Lê todos os arquivos MM-YYYY para memória (modo não-streaming)."""
+    t0 = time.perf_counter()
+    cache = open_cache()
+    dfs = [df for _, df in iter_month_files(drive, gc, month_files, workers, cache)]
+    close_cache(cache, month_files)
+    print(f"⏱️  Leitura total: {time.perf_counter() - t0:.2f}s")
+    print(f"🧠 Meses em memória: {mib(sum(frame_bytes(df) for df in dfs))}\n")
+    return dfs
+
+
+def write_csv(df: pd.DataFrame, path_or_buf, header: bool = True) -> None:
+    """Grava df no formato de saída (';', cabeçalho, BOM), sem colunas auxiliares."""
     if "__DATA_COL_A__" in df.columns:
         df = df.drop(columns=["__DATA_COL_A__"])
-
-    # grava CSV local com separador ';', cabeçalhos e BOM
     df.to_csv(
-        filename,
+        path_or_buf,
         index=False,
+        header=header,
         sep=CSV_SEPARATOR,
         encoding=CSV_ENCODING,
         lineterminator=CSV_LINE_TERMINATOR,
         quoting=CSV_QUOTING,
     )
 
-    # apaga anterior e envia novo
-    delete_if_exists(drive, filename)
 
-    media = MediaFileUpload(filename, mimetype="text/csv", resumable=False)
-    meta = {"name": filename, "parents": [FOLDER_ID], "mimeType": "text/csv"}
-    created = drive.files().create(
-        body=meta,
-        media_body=media,
-        fields="id,name",
-        supportsAllDrives=True,  # necessário em Drives Compartilhados
-    ).execute()
-    print(f"✅ Enviado: {filename} (id: {created['id']})")
+def new_spool():
+    """Buffer binário para o CSV de saída: memória até SPOOL_MAX_BYTES, depois disco temporário."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+
+
+def _text_writer(buf):
+    # BOM sai uma única vez, no início do buffer (utf-8-sig)
+    return io.TextIOWrapper(buf, encoding=CSV_ENCODING, newline="")
+
+
+def csv_to_buffer(df: pd.DataFrame):
+    buf = new_spool()
+    fh = _text_writer(buf)
+    write_csv(df, fh)
+    fh.flush()
+    fh.detach()
+    return buf
+
+
+def stream_daily_and_monthly(frames: Iterable[pd.DataFrame], buf) -> Tuple[int, pd.DataFrame]:
+    """
+    Equivalente em streaming de build_daily_and_monthly + gravação do diário:
+    cada mês é anexado ao buffer binário `buf` (cabeçalho uma única vez) e só as linhas da
+    última data de cada origem ficam em memória. Devolve (linhas no diário, monthly_df).
+
+    As colunas seguem a mesma união de pd.concat; se um mês trouxer coluna nova depois do
+    cabeçalho já gravado, o buffer é regravado em blocos com o cabeçalho final.
+    """
+    columns: List[str] = []
+    n_rows = 0
+    rewrite = False
+    candidates: List[pd.DataFrame] = []
+
+    fh = _text_writer(buf)
+    for df in frames:
+        new_cols = [c for c in df.columns if c not in columns and c != "__DATA_COL_A__"]
+        if n_rows and new_cols:
+            rewrite = True
+        columns += new_cols
+
+        part = df.reindex(columns=columns + ["__DATA_COL_A__"])
+        write_csv(part, fh, header=(n_rows == 0))
+        n_rows += len(part)
+        candidates.append(select_last_date_rows(part))
+        del part
+    fh.flush()
+    fh.detach()
+
+    if rewrite:
+        print("ℹ️  Colunas novas no meio do histórico; regravando cabeçalho do diário…")
+        _rewrite_with_columns(buf, columns)
+
+    # a mesma origem pode vir de mais de um arquivo: reaplica a seleção sobre os candidatos
+    monthly_df = select_last_date_rows(pd.concat(candidates, ignore_index=True)) if candidates else pd.DataFrame()
+    if monthly_df.empty:
+        return n_rows, pd.DataFrame()
+    return n_rows, monthly_df.reindex(columns=columns + ["__DATA_COL_A__"])
+
+
+def _rewrite_with_columns(buf, columns: List[str], chunk_rows: int = 200_000) -> None:
+    buf.seek(0)
+    # colunas só crescem à direita: linhas antigas ficam com os campos novos vazios
+    reader = pd.read_csv(buf, sep=CSV_SEPARATOR, encoding=CSV_ENCODING, dtype=str,
+                         header=None, skiprows=1, names=columns,
+                         keep_default_na=False, na_filter=False, chunksize=chunk_rows)
+    with new_spool() as tmp:
+        fh = _text_writer(tmp)
+        for i, chunk in enumerate(reader):
+            write_csv(chunk, fh, header=(i == 0))
+        fh.flush()
+        fh.detach()
+        tmp.seek(0)
+        buf.seek(0)
+        buf.truncate()
+        shutil.copyfileobj(tmp, buf)
+
+
+def delete_if_exists(folder: DriveFolder, filename: str):
+    """Remove arquivos com mesmo nome (em lote); robusto para Shared Drives (404/403)."""
+    folder.delete(folder.find(filename))
+
+
+def upload_csv_to_drive(folder: DriveFolder, df: pd.DataFrame, filename: str):
+    if df is None or df.empty:
+        print(f"⚠️  '{filename}' está vazio; não será enviado.")
+        return
+
+    # CSV em buffer com separador ';', cabeçalhos e BOM
+    with csv_to_buffer(df) as buf:
+        publish_csv(folder, buf, filename)
+
+
+def publish_csv(folder: DriveFolder, buf, filename: str) -> str:
+    """Publica o CSV de `buf` e, se PUBLISH_GZIP, também a versão .gz."""
+    file_id = publish_buffer(folder, buf, filename)
+    if PUBLISH_GZIP:
+        with gzip_buffer(buf) as gz:
+            publish_buffer(folder, gz, filename + GZIP_SUFFIX, mimetype="application/gzip")
+    return file_id
+
+
+def gzip_buffer(buf):
+    """Cópia gzip de `buf`, em streaming (não carrega o CSV inteiro)."""
+    out = new_spool()
+    buf.seek(0)
+    with gzip.GzipFile(fileobj=out, mode="wb", mtime=0) as gz:
+        shutil.copyfileobj(buf, gz)
+    return out
+
+
+def typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mensal com as colunas de data/número (por posição, como no BD_Mensal) já tipadas quando a
+    conversão é sem perda; demais colunas como texto, vazio em vez de nulo (igual ao CSV).
+    """
+    df = df.drop(columns=["__DATA_COL_A__"], errors="ignore")
+    out = {}
+    for pos, col in enumerate(df.columns, start=1):
+        kind = column_kind(pos)
+        typed = typed_column(df[col], kind) if kind else None
+        out[col] = typed if typed is not None else df[col].astype(object).fillna("").astype(str)
+    return pd.DataFrame(out, index=df.index)
+
+
+def publish_parquet(folder: DriveFolder, df: pd.DataFrame, filename: str) -> None:
+    if not HAS_PARQUET:
+        print(f"ℹ️  pyarrow indisponível; '{filename}' não será gerado.")
+        return
+    if df is None or df.empty:
+        return
+    typed = typed_frame(df)
+    n_typed = sum(1 for c in typed.columns if typed[c].dtype != object)
+    with new_spool() as buf:
+        typed.to_parquet(buf, index=False)
+        print(f"🧱 {filename}: {n_typed} colunas tipadas")
+        publish_buffer(folder, buf, filename, mimetype="application/vnd.apache.parquet")
+
+
+def publish_buffer(folder: DriveFolder, buf, filename: str, mimetype: str = "text/csv") -> str:
+    """
+    Publica o conteúdo de `buf` como `filename` na pasta.
+    Se o arquivo já existe, atualiza o conteúdo no lugar (mesmo ID); duplicados antigos são removidos.
+    """
+    size = buf.seek(0, io.SEEK_END)
+    buf.seek(0)
+    resumable = size >= RESUMABLE_MIN_BYTES
+    drive = folder.drive
+    existing = folder.find(filename)
+
+    def new_request():
+        # mídia e requisição novas a cada tentativa: o upload recomeça do início do buffer
+        buf.seek(0)
+        media = MediaIoBaseUpload(buf, mimetype=mimetype, resumable=resumable,
+                                  chunksize=UPLOAD_CHUNK_BYTES if resumable else -1)
+        if existing:
+            return drive.files().update(
+                fileId=existing[0]["id"],
+                media_body=media,
+                fields="id,name,mimeType,modifiedTime",
+                supportsAllDrives=True,
+            )
+        meta = {"name": filename, "parents": [FOLDER_ID], "mimeType": mimetype}
+        return drive.files().create(
+            body=meta,
+            media_body=media,
+            fields="id,name,mimeType,modifiedTime",
+            supportsAllDrives=True,  # necessário em Drives Compartilhados
+        )
+
+    desc = f"publicação de {filename}"
+    if existing:
+        # update no lugar é idempotente: em erro transiente o api_call recomeça o upload inteiro
+        result = api_call(lambda: _execute_upload(new_request(), filename, size, resumable), desc,
+                          kind=DRIVE, endpoint="files.upload", bytes_out=size)
+    else:
+        wait_s = SCHEDULER.wait_turn(DRIVE)  # sem retentativa: um create repetido duplicaria o arquivo
+        t0 = time.perf_counter()
+        result = _execute_upload(new_request(), filename, size, resumable)
+        SCHEDULER.trace(DRIVE, "files.upload", desc, time.perf_counter() - t0, bytes_out=size, wait_s=wait_s)
+    folder.remember(result)
+    if len(existing) > 1:
+        folder.delete(existing[1:])
+    action = "Atualizado" if existing else "Criado"
+    print(f"✅ {action}: {filename} (id: {result['id']}, {size / 1024 / 1024:.1f} MiB)")
+    return result["id"]
+
+
+def _execute_upload(request, filename: str, size: int, resumable: bool) -> dict:
+    """Envia o upload numa requisição só ou, se resumível, bloco a bloco (cada bloco na vez da cota)."""
+    if not resumable:
+        return request.execute()
+    response = None
+    first = True
+    while response is None:
+        if not first:  # a vez do primeiro bloco já foi tomada por quem chamou
+            SCHEDULER.wait_turn(DRIVE)
+        first = False
+        status, response = request.next_chunk()
+        if status is not None:
+            print(f"   ↳ {filename}: {status.resumable_progress / 1024 / 1024:.1f}"
+                  f"/{size / 1024 / 1024:.1f} MiB")
+    return response
+
+
+def report_memory(**frames: pd.DataFrame) -> None:
+    parts = [f"{name}={mib(frame_bytes(df))}" for name, df in frames.items() if df is not None]
+    peak = peak_rss()
+    if peak is not None:
+        parts.append(f"pico do processo={mib(peak)}")
+    print(f"🧠 Memória: {', '.join(parts)}")
 
 
 def main():
@@ -269,34 +780,50 @@ def main():
     print("✅ Autenticado.\n")
 
     print("🔎 Listando arquivos MM-YYYY na pasta...")
-    month_files = list_month_files(drive)
+    folder = DriveFolder(drive, FOLDER_ID, call=SCHEDULER.caller(DRIVE))
+    month_files = list_month_files(folder)
     if not month_files:
         print("⚠️  Nenhum arquivo no formato MM-YYYY encontrado na pasta.")
         sys.exit(0)
 
-    dfs = []
-    for name, fid, mime in month_files:
-        print(f"📥 Lendo '{name}' ({mime}) ...")
-        df = load_month_file_to_df(drive, gc, name, fid, mime)
-        if df.empty:
-            print(f"   ⚠️  '{name}' sem dados, ignorado.\n")
-            continue
-
-        df = ensure_first_col_datetime(df)
-        if "__DATA_COL_A__" in df.columns and df["__DATA_COL_A__"].notna().any():
-            maxd = df["__DATA_COL_A__"].max()
-            print(f"   ↳ Última data encontrada: {maxd.strftime('%d/%m/%Y')}")
-        print("   ✅ Ok.\n")
-        dfs.append(df)
-
-    print("🧮 Construindo bases...")
-    daily_df, monthly_df = build_daily_and_monthly(dfs)
-    print(f"   • Historico_Diario: {len(daily_df)} linhas")
-    print(f"   • Historico_Mensal: {len(monthly_df)} linhas\n")
-
-    print("📤 Enviando CSVs para a pasta do Drive (separador ';')...")
-    upload_csv_to_drive(drive, daily_df, OUTPUT_DAILY_NAME)
-    upload_csv_to_drive(drive, monthly_df, OUTPUT_MONTHLY_NAME)
+    if STREAMING_BUILD:
+        print("🧮 Construindo bases em streaming...")
+        t0 = time.perf_counter()
+        cache = open_cache()
+        frames = (df for _, df in iter_month_files(drive, gc, month_files, cache=cache))
+        with new_spool() as daily_buf:
+            n_daily, monthly_df = stream_daily_and_monthly(frames, daily_buf)
+            close_cache(cache, month_files)
+            print(f"⏱️  Leitura + diário: {time.perf_counter() - t0:.2f}s")
+            report_memory(monthly=monthly_df)
+            print(f"   • Historico_Diario: {n_daily} linhas")
+            print(f"   • Historico_Mensal: {len(monthly_df)} linhas\n")
+
+            print("📤 Enviando CSVs para a pasta do Drive (separador ';')...")
+            if n_daily:
+                publish_csv(folder, daily_buf, OUTPUT_DAILY_NAME)
+            else:
+                print(f"⚠️  '{OUTPUT_DAILY_NAME}' está vazio; não será enviado.")
+        upload_csv_to_drive(folder, monthly_df, OUTPUT_MONTHLY_NAME)
+        if PUBLISH_PARQUET:
+            publish_parquet(folder, monthly_df, OUTPUT_MONTHLY_PARQUET_NAME)
+    else:
+        dfs = load_month_files(drive, gc, month_files)
+
+        print("🧮 Construindo bases...")
+        daily_df, monthly_df = build_daily_and_monthly(dfs)
+        del dfs
+        report_memory(daily=daily_df, monthly=monthly_df)
+        print(f"   • Historico_Diario: {len(daily_df)} linhas")
+        print(f"   • Historico_Mensal: {len(monthly_df)} linhas\n")
+
+        print("📤 Enviando CSVs para a pasta do Drive (separador ';')...")
+        upload_csv_to_drive(folder, daily_df, OUTPUT_DAILY_NAME)
+        upload_csv_to_drive(folder, monthly_df, OUTPUT_MONTHLY_NAME)
+        if PUBLISH_PARQUET:
+            publish_parquet(folder, monthly_df, OUTPUT_MONTHLY_PARQUET_NAME)
+    print(f"\n📊 Drive (pasta): {folder.requests} requisições de listagem/metadados/exclusão.")
+    print(f"📊 Cotas: {SCHEDULER.summary()}")
     print("\n🎉 Concluído!")
 
 
@@ -0,0 +1,197 @@
+# oea_api.py
+# Agendador das chamadas às APIs Google, compartilhado por todos os scripts (substitui os
+# safe_call copiados em cada um):
+# - token bucket por classe de cota (leitura e escrita do Sheets, Drive), dimensionado pelas cotas
+#   por minuto: a chamada espera a vez antes de sair, em vez de estourar a cota e tomar 429
+# - retentativa com backoff exponencial + jitter em 408/429/5xx e erros de rede, respeitando o
+#   Retry-After; um 429 segura o bucket inteiro (as outras threads também esperam)
+# - métricas por classe: chamadas, retentativas, 429 recebidos, espera no bucket e em backoff
+# - um registro de telemetria por chamada (oea_telemetria): endpoint, volume, latência, retentativas
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from gspread.exceptions import APIError
+from googleapiclient.errors import HttpError
+
+from oea_telemetria import TRACER, observing, size_of
+
+READ = "sheets_read"
+WRITE = "sheets_write"
+DRIVE = "drive"
+
+# Cotas por minuto por usuário (a conta de serviço é um usuário só). O bucket deixa sair até
+# BURST chamadas de uma vez e repõe o resto ao longo do minuto: nenhuma janela de 60s passa da cota.
+QUOTAS_PER_MIN = {READ: 60, WRITE: 60, DRIVE: 600}
+BURST = {READ: 10, WRITE: 10, DRIVE: 50}
+
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0     # segundos; dobra a cada tentativa
+BACKOFF_MAX = 64.0
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Bucket thread-safe: `rate` fichas/s, no máximo `capacity` acumuladas."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def acquire(self) -> float:
+        """Espera uma ficha; devolve quanto tempo esperou."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def hold(self, secs: float) -> None:
+        """Cota estourada: ninguém sai por `secs` e o bucket recomeça vazio."""
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + secs)
+            self.tokens = 0.0
+            self.stamp = max(now, self.blocked_until)
+
+
+def error_status(e: Exception) -> Optional[int]:
+    if isinstance(e, APIError):
+        return getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(e, HttpError):
+        return getattr(getattr(e, "resp", None), "status", None)
+    return None
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """Segundos do cabeçalho Retry-After (gspread/requests ou googleapiclient/httplib2), se houver."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or getattr(e, "resp", None) or {}
+    try:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None  # data HTTP em vez de segundos: fica o backoff calculado
+
+
+def is_transient(e: Exception) -> bool:
+    if isinstance(e, (APIError, HttpError)):
+        return error_status(e) in RETRYABLE_STATUS
+    return isinstance(e, OSError)  # rede/conexão/timeout (requests herda de OSError)
+
+
+class ApiScheduler:
+    """Um bucket por classe de cota + retentativas + métricas (thread-safe)."""
+
+    def __init__(self, quotas: Dict[str, int] = QUOTAS_PER_MIN, burst: Dict[str, int] = BURST,
+                 max_retries: int = MAX_RETRIES):
+        self.buckets = {k: TokenBucket((per_min - burst[k]) / 60.0, burst[k]) for k, per_min in quotas.items()}
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.metrics = {k: {"calls": 0, "retries": 0, "throttled": 0, "wait_s": 0.0, "backoff_s": 0.0}
+                        for k in quotas}
+
+    def _count(self, kind: str, **inc) -> None:
+        with self.lock:
+            m = self.metrics[kind]
+            for key, v in inc.items():
+                m[key] += v
+
+    def wait_turn(self, kind: str) -> float:
+        """Espera a vez no bucket da classe (uma ficha = uma requisição HTTP); devolve a espera."""
+        waited = self.buckets[kind].acquire()
+        self._count(kind, calls=1, wait_s=waited)
+        return waited
+
+    def backoff(self, kind: str, attempt: int, e: Exception, desc: str = "chamada API",
+                max_retries: Optional[int] = None) -> float:
+        """Dorme o backoff da tentativa `attempt` (1, 2, ...) para o erro `e`; devolve a espera."""
+        base = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+        wait = base / 2 + random.uniform(0, base / 2)
+        hinted = retry_after(e)
+        if hinted is not None:
+            wait = max(wait, hinted)
+        status = error_status(e)
+        if status == 429:
+            self.buckets[kind].hold(wait)
+        self._count(kind, retries=1, throttled=int(status == 429), backoff_s=wait)
+        what = f"({status})" if status else f"de rede: {e}"
+        print(f"⚠️  Falha na {desc} {what}. Tentativa {attempt}/{max_retries or self.max_retries}. Aguardando {wait:.1f}s…")
+        time.sleep(wait)
+        return wait
+
+    def call(self, fn: Callable, desc: str = "chamada API", kind: str = WRITE, **info):
+        """
+        Executa fn() na vez do bucket `kind`, retentando erros transientes. `info` (endpoint, range,
+        rows_out, cells_out, bytes_out) vai para o registro de telemetria; o volume recebido sai
+        da resposta, ou do que fn() informar com oea_telemetria.note().
+        """
+        record = {"kind": kind, "endpoint": desc, "desc": desc, **info,
+                  "retries": 0, "wait_s": 0.0, "backoff_s": 0.0}
+        for i in range(1, self.max_retries + 1):
+            record["wait_s"] += self.wait_turn(kind)
+            t0 = time.perf_counter()
+            try:
+                with observing(record):
+                    result = fn()
+            except Exception as e:
+                record["latency_s"] = time.perf_counter() - t0
+                if not is_transient(e) or i == self.max_retries:
+                    TRACER.emit({**record, "ok": False, "status": error_status(e), "error": type(e).__name__})
+                    raise  # erro não-transiente (ex.: 400/403/404) — não adianta retentar
+                record["retries"] += 1
+                record["backoff_s"] += self.backoff(kind, i, e, desc)
+                continue
+            record["latency_s"] = time.perf_counter() - t0
+            rows, cells, n_bytes = size_of(result)
+            record.setdefault("rows_in", rows)
+            record.setdefault("cells_in", cells)
+            record.setdefault("bytes_in", n_bytes)
+            TRACER.emit({**record, "ok": True})
+            return result
+        raise RuntimeError(f"Falhou após {self.max_retries} tentativas: {desc}")
+
+    def trace(self, kind: str, endpoint: str, desc: str, latency_s: float, ok: bool = True, **fields) -> None:
+        """Registro de telemetria para chamadas que não passam por call() (ex.: blocos de upload)."""
+        TRACER.emit({"kind": kind, "endpoint": endpoint, "desc": desc, "latency_s": latency_s, "ok": ok, **fields})
+
+    def caller(self, kind: str) -> Callable:
+        """call(fn, desc) presa a uma classe — para camadas que recebem `call=` (writer, DriveFolder)."""
+        return lambda fn, desc="chamada API", **info: self.call(fn, desc, kind, **info)
+
+    def summary(self) -> str:
+        parts = []
+        with self.lock:
+            for kind, m in self.metrics.items():
+                if m["calls"]:
+                    parts.append(f"{kind}: {m['calls']} chamadas, espera na cota {m['wait_s']:.1f}s, "
+                                 f"{m['throttled']}×429, {m['retries']} retentativas ({m['backoff_s']:.1f}s)")
+        return " | ".join(parts) or "nenhuma chamada"
+
+
+# instância do processo: todas as threads e etapas dividem as mesmas cotas
+SCHEDULER = ApiScheduler()
+
+
+def direct_call(fn: Callable, desc: str = "", **info):
+    """`call` padrão dos helpers (oea_sheets, oea_drive): executa fn() direto, sem cota nem retentativa."""
+    return fn()
+
+
+def api_call(fn: Callable, desc: str = "chamada API", kind: str = WRITE, **info):
+    return SCHEDULER.call(fn, desc, kind, **info)
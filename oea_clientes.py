@@ -0,0 +1,65 @@
+# oea_clientes.py
+# Credenciais e clientes Google das etapas. Rodando um script sozinho, cada um lê o
+# credenciais.json e autentica como sempre. Quando o atualizar_oea.py roda as etapas no mesmo
+# processo, ele chama share() uma vez e, daí em diante:
+# - todas as etapas usam o MESMO objeto de credenciais (token emitido uma vez e renovado ali)
+# - o cliente gspread (sessão HTTP, conexões TLS abertas) e o serviço do Drive são reaproveitados
+#   por thread: etapas seguidas na mesma thread reusam; threads diferentes nunca dividem sessão
+#   (nem requests.Session nem httplib2 são garantidos thread-safe)
+
+import threading
+from typing import List, Optional
+
+import gspread
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
+
+# escopos de todas as etapas juntas (a credencial compartilhada precisa servir a qualquer uma)
+SHARED_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+GSPREAD_TIMEOUT = 60  # falha rapido em call travada; api_call faz o backoff
+
+_shared: Optional[Credentials] = None
+_per_thread = threading.local()
+
+
+def share(path: str) -> Credentials:
+    """Passa a compartilhar uma credencial única (chamado pelo orquestrador in-process)."""
+    global _shared
+    _shared = Credentials.from_service_account_file(path, scopes=SHARED_SCOPES)
+    return _shared
+
+
+def unshare() -> None:
+    global _shared
+    _shared = None
+
+
+def credentials(path: str, scopes: List[str]) -> Credentials:
+    """A credencial compartilhada, se houver; senão uma nova a partir do arquivo."""
+    return _shared if _shared is not None else Credentials.from_service_account_file(path, scopes=scopes)
+
+
+def gspread_client(creds: Credentials) -> gspread.Client:
+    if creds is not _shared:
+        gc = gspread.authorize(creds)
+        gc.set_timeout(GSPREAD_TIMEOUT)
+        return gc
+    gc = getattr(_per_thread, "gc", None)
+    if gc is None or getattr(_per_thread, "gc_creds", None) is not creds:
+        gc = gspread.authorize(creds)
+        gc.set_timeout(GSPREAD_TIMEOUT)
+        _per_thread.gc, _per_thread.gc_creds = gc, creds
+    return gc
+
+
+def drive_service(creds: Credentials):
+    if creds is not _shared:
+        return build("drive", "v3", credentials=creds, cache_discovery=False)
+    drive = getattr(_per_thread, "drive", None)
+    if drive is None or getattr(_per_thread, "drive_creds", None) is not creds:
+        drive = build("drive", "v3", credentials=creds, cache_discovery=False)
+        _per_thread.drive, _per_thread.drive_creds = drive, creds
+    return drive
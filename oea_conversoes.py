@@ -0,0 +1,238 @@
+# oea_conversoes.py
+# Conversões de célula do Historico_Mensal -> BD_Mensal, compartilhadas entre
+# obras_compilar_csv.py (sidecar Parquet tipado) e replicar_bd_mensal.py (colagem).
+# - Datas (A, D, AK): texto -> datetime -> serial do Google Sheets
+# - Números (E, L..Y): texto BR/US -> float
+# Valor que não converte fica como está (texto original).
+# parse_to_datetime / to_float_br_us são a referência por célula; convert_column e typed_column
+# usam o motor por coluna (valores distintos uma vez, formatos usuais resolvidos com regex +
+# aritmética em NumPy) com o mesmo resultado — conferido em tests/test_conversoes.py.
+
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Colunas a tratar (1-based)
+COLS_DATE = {1, 4, 37}                 # A, D, AK
+COLS_NUM  = {5} | set(range(12, 26))   # E, L..Y
+
+DATE_PATTERNS = [
+    "%d/%m/%Y",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+]
+
+def parse_to_datetime(val: str):
+    s = str(val).strip()
+    if not s or s.lower() in ("nan","none","null","-"):
+        return None
+    s2 = s.replace("T", " ").replace("  ", " ")
+    for fmt in DATE_PATTERNS:
+        try:
+            return datetime.strptime(s2, fmt)
+        except ValueError:
+            pass
+    m = re.match(r"^\s*(\d{1,2})/(\d{1,2})/(\d{4})(?:\s+(\d{1,2}):(\d{2})(?::(\d{2}))?)?\s*$", s2)
+    if m:
+        dd, mm, yyyy = map(int, m.group(1,2,3))
+        hh = int(m.group(4) or 0); mi = int(m.group(5) or 0); ss = int(m.group(6) or 0)
+        try:
+            return datetime(yyyy, mm, dd, hh, mi, ss)
+        except ValueError:
+            return None
+    return None
+
+def datetime_to_sheets_serial(dt: datetime) -> float:
+    base = datetime(1899, 12, 30)
+    delta = dt - base
+    return delta.days + (delta.seconds + delta.microseconds/1e6)/86400.0
+
+def to_float_br_us(val: str):
+    s = str(val).strip()
+    if s == "" or s.lower() in ("nan","none","null","-"):
+        return None
+    s2 = re.sub(r"[^\d,\.\-]", "", s)
+    if s2 == "":
+        return None
+    s2 = re.sub(r"\.(?=\d{3}(?:\D|$))", "", s2)
+    s2 = s2.replace(",", ".")
+    try:
+        return float(s2)
+    except ValueError:
+        return None
+
+def convert_value(val, kind: str):
+    """Valor final de uma célula de data/número no BD_Mensal: convertido, ou o original."""
+    if kind == "date":
+        dt = parse_to_datetime(val)
+        return datetime_to_sheets_serial(dt) if dt else val
+    f = to_float_br_us(val)
+    return f if f is not None else val
+
+# ===================== MOTOR POR COLUNA =====================
+# Só strings ASCII nos formatos abaixo passam pelo caminho vetorizado; para elas o resultado de
+# parse_to_datetime é exatamente "data válida no calendário ou None". O resto (espaços extras,
+# minuto com 1 dígito em dd/mm, dígitos não ASCII...) cai na função por célula.
+NULL_TOKENS = ("nan", "none", "null", "-")
+SHEETS_EPOCH = datetime(1899, 12, 30)
+_BR_DATE = r"([0-9]{1,2})/([0-9]{1,2})/([0-9]{4})(?: ([0-9]{1,2}):([0-9]{2})(?::([0-9]{2}))?)?"
+_ISO_DATE = r"([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})(?: ([0-9]{1,2}):([0-9]{1,2})(?::([0-9]{1,2}))?)?"
+_PLAIN_FLOAT = r"-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)"
+_DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+def _days_from_civil(y: np.ndarray, m: np.ndarray, d: np.ndarray) -> np.ndarray:
+    """Dias desde 1970-01-01 (calendário gregoriano proléptico), vetorizado."""
+    y = y - (m <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    doy = (153 * (m + np.where(m > 2, -3, 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+_EPOCH_DAYS = int(_days_from_civil(np.array([1899]), np.array([12]), np.array([30]))[0])
+
+def _clean_strings(uniques: np.ndarray) -> Tuple[pd.Series, np.ndarray]:
+    """
+    (texto sem espaços nas pontas, máscara de vazio/nulo) — como o início das funções por célula.
+    Valores que não são str viram NaN aqui e seguem para a regra por célula.
+    """
+    s = pd.Series(uniques, dtype=object).str.strip()
+    null = ((s == "") | s.str.lower().isin(NULL_TOKENS)).to_numpy(dtype=bool)
+    return s, null
+
+def date_parts(uniques: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Para strings distintas: (convertível?, dias desde 1899-12-30, segundos do dia), com o mesmo
+    resultado de parse_to_datetime.
+    """
+    n = len(uniques)
+    ok = np.zeros(n, dtype=bool)
+    days = np.zeros(n, dtype=np.int64)
+    secs = np.zeros(n, dtype=np.int64)
+    s, null = _clean_strings(uniques)
+    s2 = s.str.replace("T", " ", regex=False).str.replace("  ", " ", regex=False)
+    done = null.copy()
+
+    for pattern, order in ((_BR_DATE, (2, 1, 0)), (_ISO_DATE, (0, 1, 2))):
+        parts = s2.str.extract(f"^{pattern}$")
+        hit = parts[0].notna().to_numpy() & ~done
+        if not hit.any():
+            continue
+        p = parts[hit].fillna("0").astype(np.int64).to_numpy()
+        y, m, d = p[:, order[0]], p[:, order[1]], p[:, order[2]]
+        hh, mi, ss = p[:, 3], p[:, 4], p[:, 5]
+        m_ok = (m >= 1) & (m <= 12)
+        mi0 = np.clip(m, 1, 12) - 1
+        leap = (y % 4 == 0) & ((y % 100 != 0) | (y % 400 == 0))
+        dim = _DAYS_IN_MONTH[mi0] + ((mi0 == 1) & leap)
+        valid = (y >= 1) & m_ok & (d >= 1) & (d <= dim) & (hh <= 23) & (mi <= 59) & (ss <= 59)
+        idx = np.flatnonzero(hit)
+        ok[idx] = valid
+        days[idx] = np.where(valid, _days_from_civil(y, np.clip(m, 1, 12), d) - _EPOCH_DAYS, 0)
+        secs[idx] = np.where(valid, hh * 3600 + mi * 60 + ss, 0)
+        done[idx] = True
+
+    for i in np.flatnonzero(~done):  # formatos incomuns: regra por célula
+        dt = parse_to_datetime(uniques[i])
+        if dt is not None:
+            delta = dt - SHEETS_EPOCH
+            ok[i], days[i], secs[i] = True, delta.days, delta.seconds
+    return ok, days, secs
+
+def number_parts(uniques: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Para strings distintas: (convertível?, float), com o mesmo resultado de to_float_br_us."""
+    n = len(uniques)
+    ok = np.zeros(n, dtype=bool)
+    vals = np.zeros(n, dtype=np.float64)
+    s, null = _clean_strings(uniques)
+    # em ASCII, \d e \D das regex originais são exatamente [0-9] e [^0-9]
+    ascii_ = s.str.fullmatch(r"[\x00-\x7f]*", na=False).to_numpy(dtype=bool) & ~null
+    t = (s[ascii_]
+         .str.replace(r"[^0-9,.\-]", "", regex=True)
+         .str.replace(r"\.(?=[0-9]{3}(?:[^0-9]|$))", "", regex=True)
+         .str.replace(",", ".", regex=False))
+    plain = t.str.fullmatch(_PLAIN_FLOAT).to_numpy(dtype=bool)
+    idx = np.flatnonzero(ascii_)
+    ok[idx[plain]] = True
+    vals[idx[plain]] = t[plain].to_numpy(dtype=object).astype(np.float64)
+
+    rest = np.ones(n, dtype=bool)
+    rest[idx[plain]] = False
+    rest &= ~null
+    for i in np.flatnonzero(rest):  # "1.2.3", "-", dígitos não ASCII...: regra por célula
+        f = to_float_br_us(uniques[i])
+        if f is not None:
+            ok[i], vals[i] = True, f
+    return ok, vals
+
+def _factorize_strings(values: pd.Series):
+    """(códigos, valores distintos) se a coluna for só texto; senão None (cai na regra por célula)."""
+    codes, uniques = pd.factorize(values.to_numpy(dtype=object), use_na_sentinel=False)
+    if len(uniques) and pd.api.types.infer_dtype(uniques, skipna=False) != "string":
+        return None
+    return codes, uniques
+
+def convert_column(values: pd.Series, kind: str) -> pd.Series:
+    """convert_value na coluna inteira, convertendo cada valor distinto uma só vez."""
+    fact = _factorize_strings(values)
+    if fact is None:
+        return pd.Series([convert_value(v, kind) for v in values], index=values.index, dtype=object)
+    codes, uniques = fact
+    if kind == "date":
+        ok, days, secs = date_parts(uniques)
+        conv = days + secs / 86400.0  # mesma conta de datetime_to_sheets_serial
+    else:
+        ok, conv = number_parts(uniques)
+    out = np.array(uniques, dtype=object)
+    out[ok] = conv[ok].tolist()  # float do Python, como na regra por célula
+    return pd.Series(out.take(codes), index=values.index, dtype=object)
+
+# ===================== COLUNAS TIPADAS (Parquet) =====================
+def column_kind(col_idx_1based: int) -> Optional[str]:
+    if col_idx_1based in COLS_DATE:
+        return "date"
+    if col_idx_1based in COLS_NUM:
+        return "num"
+    return None
+
+def typed_column(values: pd.Series, kind: str) -> Optional[pd.Series]:
+    """
+    Versão tipada (datetime64 / float64) da coluna, só se for sem perda: todo valor não vazio
+    precisa converter (vazio vira NaT/NaN). Caso contrário devolve None e a coluna segue texto.
+    """
+    codes, uniques = pd.factorize(values.astype(object).fillna(""))
+    uniques = np.asarray(uniques, dtype=object)
+    empty = uniques == ""
+    if kind == "date":
+        ok, days, secs = date_parts(uniques)
+    else:
+        ok, nums = number_parts(uniques)
+    if not (ok | empty).all():
+        return None
+    if kind == "date":
+        out = [None if e else SHEETS_EPOCH + timedelta(days=d, seconds=sc)
+               for e, d, sc in zip(empty, days.tolist(), secs.tolist())]
+    else:
+        out = [None if e else x for e, x in zip(empty, nums.tolist())]
+    try:
+        if kind == "date":
+            parsed = pd.DatetimeIndex(pd.to_datetime(pd.Series(out, dtype=object), errors="raise"))
+        else:
+            parsed = pd.Index(pd.Series(out, dtype="float64"))
+    except (ValueError, OverflowError):  # ex.: data fora do intervalo do datetime64
+        return None
+    return pd.Series(parsed.take(codes, allow_fill=True), index=values.index)
+
+def sheets_value(x):
+    """Valor tipado (Timestamp / float / texto) -> valor a gravar na planilha (RAW)."""
+    if x is None or (not isinstance(x, str) and pd.isna(x)):
+        return ""
+    if isinstance(x, pd.Timestamp):
+        return datetime_to_sheets_serial(x.to_pydatetime())
+    return x
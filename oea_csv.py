@@ -0,0 +1,77 @@
+# oea_csv.py
+# Leitura de CSV com detecção de dialeto barata, compartilhada entre obras_compilar_csv.py
+# (arquivos MM-YYYY) e replicar_bd_mensal.py (Historico_Mensal.csv):
+# - encoding e separador são decididos olhando só os primeiros KB
+# - depois, UMA leitura com o engine C do pandas (nada de sep=None/engine="python" nem
+#   "tenta ',' e se quebrar lê tudo de novo com ';'")
+
+import csv
+import io
+from typing import NamedTuple
+
+import pandas as pd
+
+SAMPLE_BYTES = 64 * 1024
+CANDIDATE_SEPARATORS = (";", ",", "\t", "|")
+FALLBACK_ENCODING = "cp1252"  # CSV salvo pelo Excel em pt-BR
+
+
+class CsvDialect(NamedTuple):
+    encoding: str
+    sep: str
+
+
+def detect_encoding(sample: bytes) -> str:
+    if sample.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    # a amostra pode terminar no meio de um caractere multibyte: ignora até 3 bytes finais
+    for cut in range(4):
+        try:
+            sample[:len(sample) - cut].decode("utf-8")
+            return "utf-8"
+        except UnicodeDecodeError:
+            continue
+    return FALLBACK_ENCODING
+
+
+def detect_separator(text: str) -> str:
+    """
+    Separador escolhido pelas linhas completas da amostra: o cabeçalho precisa ter > 1 campo e
+    nenhuma linha pode ter mais campos que ele (o engine C quebraria). Entre os válidos, ganha
+    quem dá o mesmo nº de campos em todas as linhas e, depois, quem gera mais campos.
+    """
+    lines = text.splitlines()
+    if len(lines) > 1 and not text.endswith(("\n", "\r")):
+        lines = lines[:-1]  # última linha da amostra provavelmente cortada
+    lines = [ln for ln in lines if ln.strip()][:200]
+    if not lines:
+        return ","
+
+    best, best_score = ",", None
+    for sep in CANDIDATE_SEPARATORS:
+        try:
+            counts = [len(row) for row in csv.reader(lines, delimiter=sep)]
+        except csv.Error:
+            continue
+        n_fields = counts[0]
+        if n_fields < 2 or max(counts) > n_fields:
+            continue
+        # campo entre aspas com quebra de linha gera linhas "curtas": não desclassifica
+        score = (len(set(counts)) == 1, n_fields)
+        if best_score is None or score > best_score:
+            best, best_score = sep, score
+    return best
+
+
+def detect_dialect(content: bytes, sample_bytes: int = SAMPLE_BYTES) -> CsvDialect:
+    sample = content[:sample_bytes]
+    encoding = detect_encoding(sample)
+    text = sample.decode(encoding, errors="ignore")
+    return CsvDialect(encoding, detect_separator(text))
+
+
+def read_csv_bytes(content: bytes, **kwargs) -> pd.DataFrame:
+    """Detecta o dialeto pela amostra e lê o CSV inteiro numa única passada (engine C)."""
+    dialect = detect_dialect(content)
+    return pd.read_csv(io.BytesIO(content), sep=dialect.sep, encoding=dialect.encoding,
+                       engine="c", **kwargs)
@@ -0,0 +1,167 @@
+# oea_drive.py
+# Acesso à pasta do Drive com poucas requisições:
+# - a pasta é listada UMA vez por execução (snapshot); buscas por nome saem dele
+# - metadados, exclusões e envios para a lixeira vão em BatchHttpRequest (até 100 por lote)
+# Em Shared Drive o que pesa é o número de requisições, não o volume.
+# Cada requisição sai por `call` (ex.: a vez na cota do Drive + retentativas do oea_api).
+
+import io
+from typing import Callable, Dict, Iterable, List, Optional
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import DEFAULT_CHUNK_SIZE, MediaIoBaseDownload
+
+from oea_api import direct_call
+from oea_telemetria import note
+
+SHORTCUT_MIME = "application/vnd.google-apps.shortcut"
+SNAPSHOT_FIELDS = (
+    "nextPageToken, files(id, name, mimeType, modifiedTime, md5Checksum, version, "
+    "shortcutDetails(targetId, targetMimeType))"
+)
+BATCH_MAX = 100  # limite da API por lote
+
+
+def download(request, desc: str, call: Callable = direct_call, chunksize: int = DEFAULT_CHUNK_SIZE,
+             endpoint: str = "files.get_media") -> bytes:
+    """Conteúdo de um get_media/export_media, baixado em partes; cada parte sai por `call`."""
+    fh = io.BytesIO()
+    downloader = MediaIoBaseDownload(fh, request, chunksize=chunksize)
+
+    def next_chunk():
+        start = fh.tell()
+        _, done = downloader.next_chunk()
+        note(bytes_in=fh.tell() - start)
+        return done
+
+    while not call(next_chunk, desc, endpoint=endpoint):
+        pass
+    return fh.getvalue()
+
+
+class DriveFolder:
+    """Snapshot de uma pasta do Drive + operações em lote sobre os arquivos dela."""
+
+    def __init__(self, drive, folder_id: str, call: Callable = direct_call):
+        self.drive = drive
+        self.folder_id = folder_id
+        self.call = call
+        self._files: Optional[List[dict]] = None
+        self.requests = 0  # requisições HTTP feitas por esta camada (lote conta 1)
+
+    # ---------- leitura ----------
+    @property
+    def files(self) -> List[dict]:
+        if self._files is None:
+            self._files = self._list_all()
+        return self._files
+
+    def _list_all(self) -> List[dict]:
+        files, page_token = [], None
+        while True:
+            req = self.drive.files().list(
+                q=f"'{self.folder_id}' in parents and trashed = false",
+                fields=SNAPSHOT_FIELDS,
+                pageSize=1000,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+                corpora="allDrives",
+            )
+            resp = self.call(req.execute, "listagem da pasta", endpoint="files.list")
+            self.requests += 1
+            files.extend(resp.get("files", []))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return files
+
+    def find(self, name: str, mime_type: Optional[str] = None) -> List[dict]:
+        """Arquivos com este nome (e mime, se dado), mais recente primeiro."""
+        hits = [f for f in self.files
+                if (f.get("name") or "").strip() == name and (mime_type is None or f.get("mimeType") == mime_type)]
+        return sorted(hits, key=lambda f: f.get("modifiedTime", ""), reverse=True)
+
+    def latest(self, name: str, mime_type: Optional[str] = None) -> Optional[dict]:
+        hits = self.find(name, mime_type)
+        return hits[0] if hits else None
+
+    def get_many(self, file_ids: Iterable[str], fields: str) -> Dict[str, dict]:
+        """Metadados de vários arquivos (ex.: alvos de atalhos) em lotes."""
+        out: Dict[str, dict] = {}
+
+        def cb(request_id, response, exception):
+            if exception is None:
+                out[request_id] = response
+            else:
+                print(f"⚠️  Metadados de {request_id} indisponíveis: {exception}")
+
+        self._run_batches(
+            [(fid, self.drive.files().get(fileId=fid, fields=fields, supportsAllDrives=True))
+             for fid in dict.fromkeys(file_ids)],
+            cb,
+        )
+        return out
+
+    # ---------- escrita ----------
+    def remember(self, meta: dict) -> None:
+        """Registra no snapshot um arquivo criado/atualizado nesta execução."""
+        if self._files is None:
+            return
+        self._files = [f for f in self._files if f.get("id") != meta.get("id")] + [meta]
+
+    def delete(self, files: List[dict]) -> None:
+        """
+        Exclui os arquivos em lote; os que derem 403/404 (comum em Shared Drive) vão para a
+        lixeira em um segundo lote. Falhas não interrompem o fluxo.
+        """
+        if not files:
+            return
+        by_id = {f["id"]: f for f in files}
+        to_trash: List[str] = []
+
+        def on_delete(fid, _resp, exception):
+            f = by_id[fid]
+            if exception is None:
+                print(f"🧹 Apagado arquivo antigo: {f['name']} ({fid})")
+            elif isinstance(exception, HttpError) and getattr(exception.resp, "status", None) in (403, 404):
+                to_trash.append(fid)
+            else:
+                print(f"⚠️  Erro ao excluir {f['name']} ({fid}): {exception}")
+
+        def on_trash(fid, _resp, exception):
+            f = by_id[fid]
+            if exception is None:
+                print(f"🗑️  Movido para lixeira: {f['name']} ({fid})")
+            else:
+                print(f"⚠️  Não foi possível excluir/lixeirar {f['name']} ({fid}): {exception}")
+
+        self._run_batches(
+            [(fid, self.drive.files().delete(fileId=fid, supportsAllDrives=True)) for fid in by_id],
+            on_delete,
+        )
+        self._run_batches(
+            [(fid, self.drive.files().update(fileId=fid, body={"trashed": True}, supportsAllDrives=True))
+             for fid in to_trash],
+            on_trash,
+        )
+        if self._files is not None:
+            self._files = [f for f in self._files if f.get("id") not in by_id]
+
+    # ---------- lotes ----------
+    def _run_batches(self, requests, callback) -> None:
+        """Executa [(request_id, HttpRequest)]: 1 requisição direta se for um só, senão lotes."""
+        if len(requests) == 1:
+            rid, req = requests[0]
+            self.requests += 1
+            try:
+                callback(rid, self.call(req.execute, f"requisição {rid}", endpoint="files.request"), None)
+            except HttpError as e:
+                callback(rid, None, e)
+            return
+        for i in range(0, len(requests), BATCH_MAX):
+            batch = self.drive.new_batch_http_request(callback=callback)
+            for rid, req in requests[i:i + BATCH_MAX]:
+                batch.add(req, request_id=rid)
+            self.call(batch.execute, f"lote de {len(requests[i:i + BATCH_MAX])} requisições",
+                      endpoint="batch", requests=len(requests[i:i + BATCH_MAX]))
+            self.requests += 1
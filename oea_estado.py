@@ -0,0 +1,150 @@
+# oea_estado.py
+# Estado persistente entre execuções (arquivo JSON em .cache/, restaurado pelo actions/cache no CI).
+# Guarda, por etapa, a impressão digital da origem na última sincronização bem-sucedida; se a
+# origem não mudou, a etapa só atualiza o timestamp em vez de baixar e regravar tudo.
+# Antes da primeira escrita destrutiva a etapa chama invalidate(): se cair no meio, o destino não
+# é mais a última cópia e a próxima execução não pode pular nada com base nela.
+# OEA_FORCAR_SYNC=1 no ambiente ignora o estado (força a sincronização completa).
+# Journal: progresso de uma etapa DENTRO de uma execução do pipeline (OEA_EXECUCAO, definido pelo
+# atualizar_oea.py). Se a etapa cai no meio da gravação, a nova tentativa retoma dos blocos já
+# confirmados pela API em vez de limpar e reenviar tudo.
+
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+STATE_PATH = Path(".cache/estado.json")
+FORCE_ENV = "OEA_FORCAR_SYNC"
+RUN_ENV = "OEA_EXECUCAO"
+JOURNAL_DIR = Path(".cache/journal")
+
+# etapas em paralelo no mesmo processo (atualizar_oea.py) gravam o mesmo arquivo
+_record_lock = threading.Lock()
+
+
+def fingerprint(*parts) -> str:
+    """Hash estável das partes (ids, md5, versões, configuração que afeta a saída)."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RunState:
+    """Impressão digital da origem por etapa + quando foi gravada."""
+
+    def __init__(self, path: Path = STATE_PATH):
+        self.path = Path(path)
+        try:
+            self.steps = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            self.steps = {}
+
+    @staticmethod
+    def forced() -> bool:
+        return os.environ.get(FORCE_ENV, "").strip() not in ("", "0")
+
+    def last(self, step: str) -> Optional[dict]:
+        return self.steps.get(step)
+
+    def unchanged(self, step: str, fp: str) -> bool:
+        if self.forced():
+            print(f"ℹ️ {FORCE_ENV} ativo: ignorando estado salvo de '{step}'.")
+            return False
+        entry = self.steps.get(step)
+        return bool(entry) and not entry.get("interrupted_at") and entry.get("fingerprint") == fp
+
+    @staticmethod
+    def interrupted(entry: Optional[dict]) -> bool:
+        """A entrada foi invalidada por uma escrita que não chegou ao fim."""
+        return bool(entry) and bool(entry.get("interrupted_at"))
+
+    def record(self, step: str, fp: str, **info) -> None:
+        """Registra a sincronização bem-sucedida (chamar só depois que tudo foi gravado)."""
+        try:
+            self._update(step, lambda _old: {"fingerprint": fp,
+                                             "synced_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **info})
+        except Exception as e:
+            print(f"⚠️  Não foi possível salvar o estado de '{step}': {e}")
+
+    def invalidate(self, step: str) -> None:
+        """
+        Marca a última sincronização como não mais presente no destino (chamar antes de limpar ou
+        sobrescrever). Falha aqui é fatal: seguir gravando deixaria um estado que mente.
+        """
+        self._update(step, lambda old: {**(old or {}), "interrupted_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    def _update(self, step: str, make_entry) -> None:
+        with _record_lock:
+            # relê antes de gravar: outra etapa pode ter atualizado o arquivo nesta execução
+            try:
+                self.steps = json.loads(self.path.read_text(encoding="utf-8"))
+            except Exception:
+                pass
+            self.steps[step] = make_entry(self.steps.get(step))
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(self.steps, indent=1, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.path)
+
+
+def run_id() -> str:
+    """Identificador da execução do pipeline ("" quando o script roda sozinho)."""
+    return os.environ.get(RUN_ENV, "").strip()
+
+
+# etapa em execução no modo in-process (definida pelo atualizar_oea.py). Threads criadas pela etapa
+# só a enxergam se rodarem numa cópia do contexto: contextvars.copy_context().run(...)
+STEP = contextvars.ContextVar("oea_etapa", default="")
+
+
+class Journal:
+    """
+    Progresso da etapa na execução atual, um arquivo por etapa. Só vale para a mesma execução e a
+    mesma chave (impressão digital da origem + configuração que muda o que é gravado): com a origem
+    diferente, resume() devolve None e a etapa recomeça do zero. Sem OEA_EXECUCAO não faz nada.
+    """
+
+    def __init__(self, step: str, key: str, directory: Path = JOURNAL_DIR):
+        self.step = step
+        self.key = key
+        self.run = run_id()
+        self.path = Path(directory) / f"{step}.json"
+
+    def resume(self) -> Optional[dict]:
+        """Progresso salvo por uma tentativa anterior desta execução, ou None."""
+        if not self.run:
+            return None
+        try:
+            entry = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        if entry.get("run") != self.run or entry.get("key") != self.key:
+            return None
+        return entry.get("progress")
+
+    def save(self, **progress) -> None:
+        """Grava o progresso (chamar só com o que a API já confirmou)."""
+        if not self.run:
+            return
+        entry = {"run": self.run, "key": self.key, "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "progress": progress}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception as e:
+            print(f"⚠️  Não foi possível salvar o journal de '{self.step}': {e}")
+
+    def clear(self) -> None:
+        """Etapa concluída: a próxima tentativa (ou execução) não tem o que retomar."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️  Não foi possível remover o journal de '{self.step}': {e}")
@@ -0,0 +1,381 @@
+# oea_sheets.py
+# Helpers de escrita no Google Sheets compartilhados por replicar_bd_mensal.py e
+# replicar_esteira_oea.py.
+# - ValuesBatchWriter: junta vários intervalos (cabeçalho, blocos de linhas, colunas, célula de
+#   status/timestamp) em UMA chamada spreadsheets.values.batchUpdate, até um orçamento de bytes.
+# - AdaptiveChunker: esse orçamento cresce/encolhe pela latência medida; payload grande demais
+#   (413/400) ou timeout/504 divide o lote ao meio em vez de reenviar o mesmo; um lote de uma
+#   linha só que dá timeout/504 fica com a retentativa com backoff do api_call.
+# - SheetRequests: formatos numéricos, células de status/timestamp, limpezas e cópias entre abas
+#   (copyPaste, sem os dados passarem pelo cliente) numa única spreadsheets.batchUpdate por planilha.
+# - row_hashes / diff_blocks: impressão digital por linha para regravar só os trechos que mudaram.
+
+import hashlib
+import json
+import math
+import numbers
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol, absolute_range_name, rowcol_to_a1
+
+from oea_api import direct_call
+
+# Orçamento por requisição (a API recomenda payloads de poucos MB)
+CHUNK_START_BYTES = 2 * 1024 * 1024
+CHUNK_MIN_BYTES = 128 * 1024
+CHUNK_MAX_BYTES = 8 * 1024 * 1024
+CHUNK_TARGET_SECS = 8.0   # latência alvo por requisição (o timeout do cliente é 60s)
+
+
+def row_bytes(row: Sequence) -> int:
+    """Estimativa barata do tamanho em JSON de uma linha (sem serializar)."""
+    total = 3
+    for v in row:
+        total += len(str(v)) + 3
+    return total
+
+
+def estimate_bytes(values: List[List]) -> int:
+    """Estimativa barata do tamanho em JSON de uma matriz de valores (sem serializar)."""
+    return 2 + sum(row_bytes(row) for row in values)
+
+
+def is_split_error(e: Exception) -> bool:
+    """Erro que indica requisição grande demais: dividir ajuda, reenviar igual não."""
+    if isinstance(e, APIError):
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        if status == 413:
+            return True
+        # só mensagens que falam do tamanho da requisição: "Invalid JSON payload" ou "exceeds grid
+        # limits" também são 400, mas dividir não resolve e o orçamento ficaria preso lá embaixo
+        msg = str(e).lower()
+        return status == 400 and ("too large" in msg or "payload size exceeds" in msg)
+    return False
+
+
+def is_timeout_error(e: Exception) -> bool:
+    """Timeout do cliente ou 504: com lote grande, dividir costuma resolver; com uma linha, é transitório."""
+    if isinstance(e, (requests.exceptions.Timeout, TimeoutError)):
+        return True
+    return isinstance(e, APIError) and getattr(getattr(e, "response", None), "status_code", None) == 504
+
+
+class SplitRequest(Exception):
+    """Sinaliza ao flush que o lote deve ser dividido (não é retentado pelo api_call)."""
+
+    def __init__(self, cause: Exception):
+        super().__init__(str(cause))
+        self.cause = cause
+
+
+class AdaptiveChunker:
+    """
+    Orçamento de bytes por requisição: cresce 1.5x quando a chamada volta bem abaixo de
+    `target_secs`, encolhe proporcionalmente quando passa dele e cai pela metade quando o lote
+    precisou ser dividido — e daí em diante não volta a passar de 3/4 do tamanho que falhou.
+    Fica sempre entre `min_bytes` e `max_bytes`.
+    """
+
+    def __init__(self, start_bytes: int = CHUNK_START_BYTES, min_bytes: int = CHUNK_MIN_BYTES,
+                 max_bytes: int = CHUNK_MAX_BYTES, target_secs: float = CHUNK_TARGET_SECS):
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.target_secs = target_secs
+        self.ceiling = max_bytes
+        self.budget = max(min_bytes, min(start_bytes, max_bytes))
+        self.splits = 0
+
+    def _clamp(self, n: float) -> None:
+        self.budget = int(max(self.min_bytes, min(n, self.ceiling)))
+
+    def observe(self, n_bytes: int, secs: float) -> None:
+        if n_bytes < self.budget // 2:
+            return  # lote parcial (fim dos dados): não diz nada sobre o orçamento
+        if secs > self.target_secs:
+            self._clamp(self.budget * self.target_secs / secs)
+        elif secs < self.target_secs / 2:
+            self._clamp(self.budget * 1.5)
+
+    def shrink(self, failed_bytes: int) -> None:
+        self.splits += 1
+        self.ceiling = max(self.min_bytes, min(self.ceiling, failed_bytes * 3 // 4))
+        self._clamp(min(self.budget, failed_bytes) / 2)
+
+
+class ValuesBatchWriter:
+    """
+    Acumula intervalos e envia em spreadsheets.values.batchUpdate, quebrando em mais de uma
+    chamada só quando o payload passaria do orçamento do `chunker`. Os intervalos são aplicados
+    na ordem em que foram adicionados. add_rows() fatia linhas pelo orçamento (sem nº fixo de
+    linhas por bloco). Use como context manager (flush na saída sem erro) ou chame flush().
+
+        with ValuesBatchWriter(sh, call=api_call) as w:
+            w.add_rows("BD_Mensal", 1, 1, linhas)
+            w.add("RESUMO", "A2", [[ts]])
+    """
+
+    def __init__(self, sh, value_input_option: str = "RAW", chunker: Optional[AdaptiveChunker] = None,
+                 call: Callable = direct_call, on_flush: Optional[Callable] = None):
+        self.sh = sh
+        self.value_input_option = value_input_option
+        self.chunker = chunker or AdaptiveChunker()
+        self.call = call
+        self.on_flush = on_flush  # chamado após cada requisição bem-sucedida, com o próprio writer
+        self.pending: List[Tuple[str, int, int, List[List], int]] = []  # (aba, linha, coluna, valores, bytes)
+        self.pending_bytes = 0
+        self.requests = 0
+        self.ranges_sent = 0
+        self.rows_sent = 0
+
+    @property
+    def budget(self) -> int:
+        return self.chunker.budget
+
+    def _append(self, sheet_title: str, row: int, col: int, values: List[List], size: int) -> None:
+        self.pending.append((sheet_title, row, col, values, size))
+        self.pending_bytes += size
+
+    def add(self, sheet_title: str, a1_range: str, values: List[List], size: Optional[int] = None) -> None:
+        """Intervalo pronto (ex.: célula de status); `a1_range` só precisa indicar o canto superior esquerdo."""
+        if not values:
+            return
+        size = estimate_bytes(values) if size is None else size
+        if self.pending and self.pending_bytes + size > self.budget:
+            self.flush()
+        row, col = a1_to_rowcol(a1_range.split(":")[0])
+        self._append(sheet_title, row, col, values, size)
+
+    def add_rows(self, sheet_title: str, start_row: int, start_col: int, rows: List[List]) -> None:
+        """Linhas a partir de (start_row, start_col), fatiadas para encher cada requisição até o orçamento."""
+        i = 0
+        while i < len(rows):
+            room = self.budget - self.pending_bytes
+            if self.pending and room < self.budget // 8:
+                self.flush()
+                continue
+            size, j = 0, i
+            while j < len(rows):
+                rb = row_bytes(rows[j])
+                if j > i and size + rb > room:
+                    break
+                size += rb
+                j += 1
+            self._append(sheet_title, start_row + i, start_col, rows[i:j], size + 2)
+            i = j
+            if self.pending_bytes >= self.budget:
+                self.flush()
+
+    @staticmethod
+    def _range_name(sheet_title: str, row: int, col: int, values: List[List]) -> str:
+        width = max((len(r) for r in values), default=1) or 1
+        end = rowcol_to_a1(row + len(values) - 1, col + width - 1)
+        return absolute_range_name(sheet_title, f"{rowcol_to_a1(row, col)}:{end}")
+
+    def _send(self, entries) -> None:
+        body = {"valueInputOption": self.value_input_option,
+                "data": [{"range": self._range_name(t, r, c, v), "values": v} for t, r, c, v, _ in entries]}
+
+        took = [0.0]  # duração da tentativa que deu certo (sem espera de cota nem backoff)
+        # timeout/504 só divide se houver o que dividir; com uma linha, o api_call retenta
+        splittable = len(entries) > 1 or len(entries[0][3]) > 1
+
+        def attempt():
+            t0 = time.time()
+            try:
+                resp = self.sh.values_batch_update(body=body)
+                took[0] = time.time() - t0
+                return resp
+            except Exception as e:
+                if is_split_error(e) or (splittable and is_timeout_error(e)):
+                    raise SplitRequest(e) from e
+                raise
+
+        n_bytes = sum(e[4] for e in entries)
+        n_rows = sum(len(e[3]) for e in entries)
+        desc = f"batchUpdate ({len(entries)} intervalos, {n_rows} linhas, ~{n_bytes / 1024:.0f} KB)"
+        first = body["data"][0]["range"]
+        try:
+            self.call(attempt, desc, endpoint="values.batchUpdate",
+                      range=first if len(entries) == 1 else f"{first} (+{len(entries) - 1})",
+                      rows_out=n_rows, cells_out=sum(len(r) for e in entries for r in e[3]), bytes_out=n_bytes)
+        except SplitRequest as e:
+            halves = self._split(entries)
+            if halves is None:
+                raise e.cause
+            self.chunker.shrink(n_bytes)
+            print(f"   ✂️  {desc} grande demais ({e}); dividindo e reduzindo o orçamento para "
+                  f"~{self.budget / 1024:.0f} KB")
+            for half in halves:
+                self._send(half)
+            return
+        secs = took[0]
+        self.chunker.observe(n_bytes, secs)
+        self.requests += 1
+        self.ranges_sent += len(entries)
+        self.rows_sent += n_rows
+        print(f"   📦 {desc} | ⏱️ {secs:.2f}s")
+        if self.on_flush:
+            self.on_flush(self)
+
+    @staticmethod
+    def _split(entries):
+        """Divide o lote em dois: por intervalos, ou pelas linhas do único intervalo. None se for 1 linha."""
+        if len(entries) > 1:
+            mid = len(entries) // 2
+            return [entries[:mid], entries[mid:]]
+        t, r, c, v, size = entries[0]
+        if len(v) < 2:
+            return None
+        mid = len(v) // 2
+        return [[(t, r, c, v[:mid], size // 2)], [(t, r + mid, c, v[mid:], size - size // 2)]]
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        entries = self.pending
+        self.pending, self.pending_bytes = [], 0
+        self._send(entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+
+def extended_value(v) -> dict:
+    """Valor no formato ExtendedValue da API (equivalente a enviar com valueInputOption RAW)."""
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, numbers.Real):
+        return {"numberValue": float(v)}
+    return {"stringValue": "" if v is None else str(v)}
+
+
+class SheetRequests:
+    """
+    Acumula requests de spreadsheets.batchUpdate (formatos, valores de célula, limpezas) e envia
+    tudo em UMA chamada. Os requests são aplicados pela API na ordem em que foram adicionados.
+    """
+
+    def __init__(self, sh, call: Callable = direct_call):
+        self.sh = sh
+        self.call = call
+        self.requests: List[dict] = []
+
+    def number_format(self, ws, a1_range: str, type_: str, pattern: str) -> None:
+        self.requests.append({"repeatCell": {
+            "range": a1_range_to_grid_range(a1_range, ws.id),
+            "cell": {"userEnteredFormat": {"numberFormat": {"type": type_, "pattern": pattern}}},
+            "fields": "userEnteredFormat.numberFormat",
+        }})
+
+    def set_value(self, ws, a1_cell: str, value, number_format: Optional[Tuple[str, str]] = None) -> None:
+        cell = {"userEnteredValue": extended_value(value)}
+        fields = "userEnteredValue"
+        if number_format:
+            cell["userEnteredFormat"] = {"numberFormat": {"type": number_format[0], "pattern": number_format[1]}}
+            fields += ",userEnteredFormat.numberFormat"
+        self.requests.append({"updateCells": {
+            "range": a1_range_to_grid_range(a1_cell, ws.id),
+            "rows": [{"values": [cell]}],
+            "fields": fields,
+        }})
+
+    def clear_values(self, ws, a1_range: str) -> None:
+        """Apaga só o conteúdo (como values.batchClear), mantendo a formatação."""
+        self.requests.append({"updateCells": {
+            "range": a1_range_to_grid_range(a1_range, ws.id),
+            "fields": "userEnteredValue",
+        }})
+
+    def copy_paste(self, source: dict, ws, a1_cell: str, paste_type: str = "PASTE_VALUES") -> None:
+        """Cola o GridRange `source` (pode ser de outra aba da mesma planilha) a partir de a1_cell em ws."""
+        row, col = a1_to_rowcol(a1_cell)
+        n_rows = source["endRowIndex"] - source["startRowIndex"]
+        n_cols = source["endColumnIndex"] - source["startColumnIndex"]
+        self.requests.append({"copyPaste": {
+            "source": source,
+            "destination": {
+                "sheetId": ws.id,
+                "startRowIndex": row - 1, "endRowIndex": row - 1 + n_rows,
+                "startColumnIndex": col - 1, "endColumnIndex": col - 1 + n_cols,
+            },
+            "pasteType": paste_type,
+            "pasteOrientation": "NORMAL",
+        }})
+
+    def delete_sheet(self, sheet_id: int) -> None:
+        self.requests.append({"deleteSheet": {"sheetId": sheet_id}})
+
+    def execute(self, desc: str = "batchUpdate") -> None:
+        if not self.requests:
+            return
+        body = {"requests": self.requests}
+        self.call(lambda: self.sh.batch_update(body), f"{desc} ({len(self.requests)} requests)",
+                  endpoint="spreadsheets.batchUpdate", requests=len(self.requests),
+                  bytes_out=len(json.dumps(body, default=str)))
+        self.requests = []
+
+
+# ===================== DIFERENCIAL POR LINHA =====================
+def cell_key(v) -> str:
+    """
+    Forma canônica de uma célula, igual para o valor que enviamos (RAW) e o que a API devolve
+    com UNFORMATTED_VALUE/SERIAL_NUMBER: vazio/None somem, 45000.0 == 45000, texto fica texto.
+    """
+    if v is None or v == "":
+        return ""
+    if isinstance(v, bool):
+        return f"b:{v}"
+    if isinstance(v, numbers.Integral):
+        return f"n:{int(v)}"
+    if isinstance(v, numbers.Real):
+        f = float(v)
+        if math.isnan(f):
+            return ""
+        return f"n:{int(f)}" if f.is_integer() else f"n:{f!r}"
+    return f"s:{v}"
+
+
+def row_hashes(rows: Sequence[Sequence], n_cols: int) -> List[str]:
+    """Hash curto de cada linha nas primeiras `n_cols` colunas (linhas curtas contam como vazias no fim)."""
+    out = []
+    for row in rows:
+        keys = [cell_key(v) for v in row[:n_cols]]
+        while keys and keys[-1] == "":
+            keys.pop()
+        out.append(hashlib.blake2b("\x1f".join(keys).encode("utf-8"), digest_size=8).hexdigest())
+    return out
+
+
+def diff_blocks(old: Sequence[str], new: Sequence[str], merge_gap: int = 0) -> List[Tuple[int, int]]:
+    """
+    Trechos [início, fim) de `new` (índices 0-based) cujas linhas diferem de `old` (linha a mais
+    em `new` conta como diferente). Trechos separados por até `merge_gap` linhas iguais são unidos
+    (menos intervalos no batchUpdate, ao custo de regravar algumas linhas iguais).
+    """
+    blocks: List[Tuple[int, int]] = []
+    start = None
+    for i, h in enumerate(new):
+        if i < len(old) and old[i] == h:
+            if start is not None:
+                blocks.append((start, i))
+                start = None
+        elif start is None:
+            start = i
+    if start is not None:
+        blocks.append((start, len(new)))
+
+    merged: List[Tuple[int, int]] = []
+    for b in blocks:
+        if merged and b[0] - merged[-1][1] <= merge_gap:
+            merged[-1] = (merged[-1][0], b[1])
+        else:
+            merged.append(b)
+    return merged
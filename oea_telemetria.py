@@ -0,0 +1,257 @@
+# oea_telemetria.py
+# Telemetria por chamada às APIs Google. Cada chamada que passa pelo oea_api (e os blocos do upload
+# resumível) vira uma linha JSON em logs/telemetria_<execução>.jsonl: etapa, endpoint, intervalo,
+# linhas/células/bytes enviados e recebidos, latência, tentativas, espera na cota e em backoff.
+# No fim da execução o orquestrador resume o trace numa tabela por etapa/endpoint, acrescenta o
+# resumo ao histórico (.cache/, restaurado pelo actions/cache no CI) e compara com as execuções
+# anteriores: vazão de um endpoint bem abaixo da mediana recente vira aviso de regressão (a duração
+# da etapa não serve de base: execuções que pulam a origem sem mudanças são muito mais curtas).
+#
+#   python oea_telemetria.py [logs/telemetria_<execução>.jsonl]   # tabela de um trace (padrão: o último)
+
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from oea_estado import STEP, run_id
+
+TRACE_DIR = Path("logs")
+HISTORY_PATH = Path(".cache/telemetria/historico.jsonl")
+HISTORY_KEEP = 200          # execuções guardadas no histórico
+BASELINE_RUNS = 10          # execuções anteriores que formam a linha de base (mediana)
+BASELINE_MIN = 3            # abaixo disso não há base para comparar
+REGRESSION_DROP = 0.3       # vazão 30% abaixo da mediana = regressão
+MIN_ROWS = 1000             # vazão em linhas/s só com pelo menos isso de linhas...
+MIN_MB = 5.0                # ...senão em MB/s (downloads/uploads do Drive), com pelo menos isso de MB
+
+_local = threading.local()
+_fallback_run = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+
+
+def current_run() -> str:
+    """Id da execução do pipeline; rodando um script sozinho, um id próprio do processo."""
+    return run_id() or _fallback_run
+
+
+def current_step() -> str:
+    """Etapa do contexto (o orquestrador in-process define oea_estado.STEP); senão o script em execução."""
+    return STEP.get() or Path(sys.argv[0]).stem or "interativo"
+
+
+def trace_path(run: Optional[str] = None) -> Path:
+    return TRACE_DIR / f"telemetria_{run or current_run()}.jsonl"
+
+
+def size_of(value) -> Tuple[int, int, int]:
+    """(linhas, células, bytes) aproximados de uma resposta: matriz de valores, dict JSON ou bytes."""
+    from oea_sheets import estimate_bytes  # aqui: oea_sheets importa oea_api, que importa este módulo
+    if isinstance(value, dict) and isinstance(value.get("values"), list):
+        value = value["values"]
+    if isinstance(value, list) and all(isinstance(r, list) for r in value):
+        return len(value), sum(len(r) for r in value), estimate_bytes(value)
+    if isinstance(value, (bytes, bytearray, str)):
+        return 0, 0, len(value)
+    if isinstance(value, dict):
+        return 0, 0, len(json.dumps(value, default=str))
+    return 0, 0, 0
+
+
+@contextmanager
+def observing(record: dict):
+    """Torna `record` o alvo do note() enquanto a chamada roda nesta thread."""
+    _local.record = record
+    try:
+        yield record
+    finally:
+        _local.record = None
+
+
+def note(**fields) -> None:
+    """Acrescenta campos ao registro da chamada em andamento nesta thread (ex.: bytes baixados)."""
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record.update(fields)
+
+
+class Tracer:
+    """Grava os registros em JSON lines (append; várias threads e processos no mesmo arquivo)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failed = False
+
+    def emit(self, record: dict) -> None:
+        if self.failed:
+            return
+        record = {k: round(v, 4) if isinstance(v, float) else v for k, v in record.items()}
+        line = json.dumps({"ts": round(time.time(), 3), "run": current_run(), "step": current_step(),
+                           **record}, ensure_ascii=False, default=str)
+        path = trace_path()
+        try:
+            with self.lock:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            self.failed = True  # telemetria nunca derruba a etapa
+            print(f"⚠️  Telemetria desligada: não foi possível gravar {path} ({e})")
+
+
+TRACER = Tracer()
+
+
+# ===================== RESUMO =====================
+def load_trace(path: Path) -> List[dict]:
+    records = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass  # linha cortada (processo morto no meio da gravação)
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(records: List[dict]) -> Dict[str, dict]:
+    """Métricas por "etapa · endpoint": chamadas, erros, volume, latência e vazão."""
+    groups: Dict[str, List[dict]] = defaultdict(list)
+    for r in records:
+        groups[f"{r.get('step', '?')} · {r.get('endpoint', '?')}"].append(r)
+    out = {}
+    for key, recs in sorted(groups.items()):
+        lat = [r.get("latency_s", 0.0) for r in recs if r.get("ok", True)]
+        busy = sum(lat)
+        rows = sum(r.get("rows_out", 0) + r.get("rows_in", 0) for r in recs if r.get("ok", True))
+        n_bytes = sum(r.get("bytes_out", 0) + r.get("bytes_in", 0) for r in recs if r.get("ok", True))
+        out[key] = {
+            "calls": len(recs),
+            "errors": sum(1 for r in recs if not r.get("ok", True)),
+            "retries": sum(r.get("retries", 0) for r in recs),
+            "rows": rows,
+            "cells": sum(r.get("cells_out", 0) + r.get("cells_in", 0) for r in recs if r.get("ok", True)),
+            "mb": n_bytes / 1024 / 1024,
+            "busy_s": busy,
+            "p50_s": percentile(lat, 0.5),
+            "p95_s": percentile(lat, 0.95),
+            "wait_s": sum(r.get("wait_s", 0.0) for r in recs),
+            "backoff_s": sum(r.get("backoff_s", 0.0) for r in recs),
+            "rows_per_s": rows / busy if busy > 0 else 0.0,
+            "mb_per_s": n_bytes / 1024 / 1024 / busy if busy > 0 else 0.0,
+        }
+    return out
+
+
+def format_table(stats: Dict[str, dict]) -> str:
+    if not stats:
+        return "   (nenhuma chamada registrada)"
+    width = max(len(k) for k in stats)
+    lines = [f"   {'etapa · endpoint':<{width}} {'chamadas':>8} {'erros':>5} {'retent.':>7} {'linhas':>9}"
+             f" {'MB':>7} {'p50':>6} {'p95':>6} {'linhas/s':>9} {'MB/s':>6} {'cota+backoff':>12}"]
+    for key, m in stats.items():
+        lines.append(f"   {key:<{width}} {m['calls']:>8} {m['errors']:>5} {m['retries']:>7} {m['rows']:>9,}"
+                     f" {m['mb']:>7.1f} {m['p50_s']:>5.2f}s {m['p95_s']:>5.2f}s {m['rows_per_s']:>9,.0f}"
+                     f" {m['mb_per_s']:>6.2f} {m['wait_s'] + m['backoff_s']:>11.1f}s")
+    return "\n".join(lines)
+
+
+# ===================== HISTÓRICO =====================
+def load_history(path: Path = HISTORY_PATH) -> List[dict]:
+    return load_trace(path)
+
+
+def append_history(entry: dict, path: Path = HISTORY_PATH) -> None:
+    try:
+        history = load_history(path)[-(HISTORY_KEEP - 1):] + [entry]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text("".join(json.dumps(h, ensure_ascii=False) + "\n" for h in history), encoding="utf-8")
+        tmp.replace(path)
+    except Exception as e:
+        print(f"⚠️  Não foi possível atualizar o histórico de telemetria: {e}")
+
+
+def find_regressions(entry: dict, history: List[dict]) -> List[str]:
+    """Vazão de cada etapa · endpoint contra a mediana das últimas BASELINE_RUNS execuções."""
+    found = []
+    recent = history[-BASELINE_RUNS:]
+    for key, m in entry.get("metrics", {}).items():
+        rate = throughput(m)
+        if rate is None:
+            continue
+        field, unit = rate
+        base = [h["metrics"][key][field] for h in recent
+                if throughput(h.get("metrics", {}).get(key, {})) == rate]
+        if len(base) < BASELINE_MIN:
+            continue
+        median = statistics.median(base)
+        if median > 0 and m[field] < (1 - REGRESSION_DROP) * median:
+            found.append(f"{key}: vazão caiu {1 - m[field] / median:.0%} "
+                         f"({median:,.1f} → {m[field]:,.1f} {unit}; mediana de {len(base)} execuções)")
+    return found
+
+
+def throughput(m: dict) -> Optional[Tuple[str, str]]:
+    """Qual vazão comparar num endpoint: linhas/s, MB/s, ou nenhuma (volume pequeno demais)."""
+    if m.get("rows", 0) >= MIN_ROWS:
+        return "rows_per_s", "linhas/s"
+    if m.get("mb", 0) >= MIN_MB:
+        return "mb_per_s", "MB/s"
+    return None
+
+
+def report(run: str, steps: Dict[str, Tuple[str, float]], total_s: float) -> None:
+    """Fim da execução: tabela do trace, linha no histórico e avisos de regressão."""
+    stats = summarize(load_trace(trace_path(run)))
+    print(f"\n📈 Telemetria ({trace_path(run)}):")
+    print(format_table(stats))
+    entry = {
+        "run": run,
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "total_s": round(total_s, 1),
+        "steps": {Path(s).stem: {"status": status, "secs": round(secs, 1)} for s, (status, secs) in steps.items()},
+        "metrics": {k: {"calls": m["calls"], "rows": m["rows"], "mb": round(m["mb"], 2),
+                        "rows_per_s": round(m["rows_per_s"], 1), "mb_per_s": round(m["mb_per_s"], 3),
+                        "p50_s": round(m["p50_s"], 3)}
+                    for k, m in stats.items()},
+    }
+    history = load_history()
+    regressions = find_regressions(entry, history)
+    append_history(entry)
+    for msg in regressions:
+        print(f"⚠️  Regressão: {msg}")
+    if history and not regressions:
+        print(f"✅ Sem regressões frente às últimas {min(len(history), BASELINE_RUNS)} execuções.")
+
+
+def main():
+    if len(sys.argv) > 1:
+        path = Path(sys.argv[1])
+    else:
+        traces = sorted(TRACE_DIR.glob("telemetria_*.jsonl"), key=lambda p: p.stat().st_mtime)
+        if not traces:
+            print(f"Nenhum trace em {TRACE_DIR}/.")
+            sys.exit(1)
+        path = traces[-1]
+    print(f"📈 {path}")
+    print(format_table(summarize(load_trace(path))))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,28 +4,32 @@
 #    - A, D, AK -> data (serial do Google Sheets)
 #    - E, L..Y  -> número
 # 3) Grava timestamp em RESUMO!A2 (formato dd/mm/yyyy HH:mm, America/Sao_Paulo).
+# Os blocos de valores vão em spreadsheets.values.batchUpdate multi-intervalo; formatos de data e o
+# RESUMO!A2 vão juntos numa única spreadsheets.batchUpdate no fim (oea_sheets.py).
+# Modo diferencial (DIFF_SYNC): só os trechos de linhas que mudaram são regravados; resultado
+# final idêntico ao de limpar e colar tudo.
+# WRITE_THEN_TRIM: sobrescreve no lugar e só limpa as sobras (abaixo/à direita) no fim.
+# Se o CSV tem o mesmo md5 da última importação bem-sucedida (oea_estado.py), só o A2 é atualizado.
 # Compatível com gspread 6.x (update(values, range_name=...)).
 
 import io
-import re
+import json
 import sys
-import time
 from datetime import datetime
-from typing import Optional, Tuple
+from pathlib import Path
+from typing import List, Optional, Tuple
 
 import pandas as pd
 
 import gspread
-from gspread.exceptions import APIError, WorksheetNotFound
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 
-try:
-    from gspread_formatting import format_cell_range, CellFormat, NumberFormat
-    HAS_FMT = True
-except Exception:
-    HAS_FMT = False
+from oea_api import READ, DRIVE, SCHEDULER, api_call
+from oea_clientes import credentials, drive_service, gspread_client
+from oea_csv import read_csv_bytes
+from oea_drive import DriveFolder, download
+from oea_estado import Journal, RunState, fingerprint
+from oea_sheets import ValuesBatchWriter, SheetRequests, cell_key, row_hashes, diff_blocks
+from oea_conversoes import COLS_DATE, COLS_NUM, column_kind, convert_column, sheets_value
 
 # Timezone
 try:
@@ -39,21 +43,46 @@ CAMINHO_CRED = "credenciais.json"
 
 FOLDER_ID = "1108v_R_-KpYXclfUPaXsRqzsyQ0tiMjh"  # pasta do Drive
 CSV_NAME  = "Historico_Mensal.csv"
+# Sidecar tipado publicado pelo obras_compilar_csv.py: usado no lugar do CSV quando for
+# pelo menos tão recente quanto ele (menos bytes, datas/números já convertidos)
+PARQUET_NAME = "Historico_Mensal.parquet"
+PREFER_PARQUET = True
 
 DEST_SPREADSHEET_ID = "1-ZguV_LFofJ2F-Emn0UQQx1UfVOcKpTXZb1VryVeds4"
 DEST_WORKSHEET = "BD_Mensal"
 
+RESUMO_WORKSHEET = "RESUMO"
+
 RANGE_CLEAR = "A:AK"    # limpa apenas conteúdo A..AK
 MAX_COLS = 37           # limite máximo (AK)
-CHUNK_ROWS = 2000
 VALUE_INPUT_OPTION_RAW = "RAW"
+DATE_FORMAT_COLS = {1: "A", 4: "D", 37: "AK"}  # formatadas dd/mm/yyyy depois da colagem
+
+# Converte datas/números em memória antes de colar: cada bloco vai uma vez, já tipado,
+# em vez de colar tudo como texto e depois reenviar as 18 colunas convertidas.
+TYPED_SINGLE_PASS = True
+
+# Sincronização diferencial (exige TYPED_SINGLE_PASS: os valores finais precisam estar em memória).
+# Compara um hash por linha com o conteúdo atual de BD_Mensal e regrava só os trechos alterados,
+# limpando apenas a cauda se a base encolheu. Se mudar mais que DIFF_MAX_RATIO das linhas,
+# volta para limpar A:AK e colar tudo.
+DIFF_SYNC = True
+DIFF_SOURCE = "sheet"   # "sheet": lê A:AK atual (à prova de edição manual) | "manifest": hashes da última execução
+DIFF_MANIFEST = Path(".cache/bd_mensal/row_hashes.json")
+DIFF_MAX_RATIO = 0.5
+DIFF_MERGE_GAP = 20     # une trechos alterados separados por até N linhas iguais
 
-MAX_API_RETRIES = 6
-BASE_SLEEP = 2.0
+# Publica sobrescrevendo no lugar em vez de limpar A:AK antes: BD_Mensal não fica vazia durante
+# o upload e as fórmulas dependentes recalculam uma vez. As sobras da base anterior (linhas abaixo
+# da nova, colunas além de num_cols) são limpas no fim, na mesma batchUpdate dos formatos.
+WRITE_THEN_TRIM = True
 
-# Colunas a tratar (1-based)
-COLS_DATE = {1, 4, 37}                 # A, D, AK
-COLS_NUM  = {5} | set(range(12, 26))   # E, L..Y
+# Pula download/colagem quando a origem é a mesma da última importação bem-sucedida
+SKIP_IF_UNCHANGED = True
+STATE_STEP = "bd_mensal"
+
+
+# Colunas a tratar (1-based): COLS_DATE = A, D, AK | COLS_NUM = E, L..Y (ver oea_conversoes.py)
 
 # ===================== AUTH =====================
 def auth_clients():
@@ -61,66 +90,57 @@ def auth_clients():
         "https://www.googleapis.com/auth/drive.readonly",
         "https://www.googleapis.com/auth/spreadsheets",
     ]
-    creds = Credentials.from_service_account_file(CAMINHO_CRED, scopes=scopes)
-    gc = gspread.authorize(creds)
-    gc.set_timeout(60)  # falha rapido em call travada; safe_call faz o backoff
-    drive = build("drive", "v3", credentials=creds, cache_discovery=False)
-    return gc, drive
+    creds = credentials(CAMINHO_CRED, scopes)
+    return gspread_client(creds), drive_service(creds)
 
 # ===================== DRIVE =====================
-def get_latest_csv_from_folder(drive, folder_id: str, name: str) -> Optional[Tuple[str, str]]:
-    query = (
-        f"'{folder_id}' in parents and name = '{name}' and "
-        f"mimeType = 'text/csv' and trashed = false"
-    )
-    resp = drive.files().list(
-        q=query,
-        spaces="drive",
-        fields="files(id, name, modifiedTime)",
-        orderBy="modifiedTime desc",
-        pageSize=5,
-        supportsAllDrives=True,
-        includeItemsFromAllDrives=True,
-        corpora="allDrives",
-    ).execute()
-    files = resp.get("files", [])
-    if not files:
+def get_latest_csv_from_folder(folder: DriveFolder, name: str) -> Optional[Tuple[str, str]]:
+    return get_latest_file_from_folder(folder, name, mime_type="text/csv")
+
+def get_latest_file_from_folder(folder: DriveFolder, name: str,
+                                mime_type: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    # busca no snapshot da pasta (uma única listagem por execução)
+    f = folder.latest(name, mime_type)
+    if not f:
         return None
-    f = files[0]
     return f["id"], f["modifiedTime"]
 
 def download_file_content(drive, file_id: str) -> bytes:
     request = drive.files().get_media(fileId=file_id, supportsAllDrives=True)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
-    return fh.getvalue()
+    return download(request, f"download {file_id}", call=SCHEDULER.caller(DRIVE))
 
-# ===================== SHEETS HELPERS =====================
-RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+def read_parquet_sidecar(folder: DriveFolder, csv_mtime: str) -> Optional[pd.DataFrame]:
+    """Lê o Historico_Mensal.parquet se existir e não for mais antigo que o CSV; senão None."""
+    res = get_latest_file_from_folder(folder, PARQUET_NAME)
+    if not res:
+        return None
+    pq_id, pq_mtime = res
+    if pq_mtime < csv_mtime:  # RFC 3339 em UTC: comparação de texto basta
+        print(f"ℹ️  '{PARQUET_NAME}' mais antigo que o CSV ({pq_mtime}); usando o CSV.")
+        return None
+    try:
+        content = download_file_content(folder.drive, pq_id)
+        df = pd.read_parquet(io.BytesIO(content))
+    except Exception as e:
+        print(f"⚠️  Não consegui ler '{PARQUET_NAME}': {e}. Usando o CSV.")
+        return None
+    print(f"🧱 Usando '{PARQUET_NAME}' ({len(content)} bytes, tipado).\n")
+    return df
 
-def safe_call(fn, desc="chamada API"):
-    for i in range(1, MAX_API_RETRIES + 1):
-        try:
-            return fn()
-        except APIError as e:
-            status = getattr(getattr(e, "response", None), "status_code", None)
-            if status not in RETRYABLE_STATUS or i == MAX_API_RETRIES:
-                raise  # erro não-transiente (ex.: 400/403/404) — não adianta retentar
-            wait = BASE_SLEEP * i
-            print(f"⚠️  Falha na {desc} ({status}). Tentativa {i}/{MAX_API_RETRIES}. Aguardando {wait:.1f}s...")
-            time.sleep(wait)
-        except OSError as e:
-            # erros de rede/conexao (requests herda de OSError) — transientes
-            if i == MAX_API_RETRIES:
-                raise
-            wait = BASE_SLEEP * i
-            print(f"⚠️  Erro de rede na {desc}: {e}. Tentativa {i}/{MAX_API_RETRIES}. Aguardando {wait:.1f}s...")
-            time.sleep(wait)
-    raise RuntimeError(f"Falhou: {desc}")
+def read_csv_historico(drive, file_id: str) -> pd.DataFrame:
+    print("📥 Baixando CSV…")
+    content = download_file_content(drive, file_id)
+    print(f"✅ {len(content)} bytes baixados.\n")
+
+    # separador/encoding detectados pelos primeiros KB; uma única leitura com o engine C
+    try:
+        df = read_csv_bytes(content, dtype=str, keep_default_na=False, na_filter=False)
+    except Exception as e:
+        print(f"❌ Falha ao ler o CSV: {e}")
+        sys.exit(1)
+    return df
 
+# ===================== SHEETS HELPERS =====================
 def ensure_min_rows(ws, required_rows: int):
     try:
         current_rows = ws.row_count
@@ -128,94 +148,138 @@ def ensure_min_rows(ws, required_rows: int):
         current_rows = None
     if current_rows is None or required_rows > current_rows:
         delta = required_rows - (current_rows or 0)
-        safe_call(lambda: ws.add_rows(delta) if current_rows else ws.resize(rows=required_rows),
-                  "aumentar linhas")
+        api_call(lambda: ws.add_rows(delta) if current_rows else ws.resize(rows=required_rows),
+                 "aumentar linhas", endpoint="spreadsheets.batchUpdate")
 
 def batch_clear(ws, a1_range: str):
-    safe_call(lambda: ws.batch_clear([a1_range]), f"limpeza {a1_range}")
-
-def update_chunk(ws, start_row: int, start_col: int, values, value_input_option="RAW"):
-    import gspread.utils as gu
-    if not values:
-        return
-    end_row = start_row + len(values) - 1
-    end_col = start_col + (len(values[0]) - 1 if values and values[0] else 0)
-    rng = f"{gu.rowcol_to_a1(start_row, start_col)}:{gu.rowcol_to_a1(end_row, end_col)}"
-    # gspread 6.x: valores primeiro, range_name nomeado
-    safe_call(lambda: ws.update(values, range_name=rng, value_input_option=value_input_option),
-              f"update {rng}")
-
-# ===================== CONVERSÕES =====================
-DATE_PATTERNS = [
-    "%d/%m/%Y",
-    "%d/%m/%Y %H:%M",
-    "%d/%m/%Y %H:%M:%S",
-    "%Y-%m-%d",
-    "%Y-%m-%d %H:%M",
-    "%Y-%m-%d %H:%M:%S",
-]
-
-def parse_to_datetime(val: str):
-    s = str(val).strip()
-    if not s or s.lower() in ("nan","none","null","-"):
-        return None
-    s2 = s.replace("T", " ").replace("  ", " ")
-    for fmt in DATE_PATTERNS:
-        try:
-            return datetime.strptime(s2, fmt)
-        except ValueError:
-            pass
-    m = re.match(r"^\s*(\d{1,2})/(\d{1,2})/(\d{4})(?:\s+(\d{1,2}):(\d{2})(?::(\d{2}))?)?\s*$", s2)
-    if m:
-        dd, mm, yyyy = map(int, m.group(1,2,3))
-        hh = int(m.group(4) or 0); mi = int(m.group(5) or 0); ss = int(m.group(6) or 0)
+    api_call(lambda: ws.batch_clear([a1_range]), f"limpeza {a1_range}",
+             endpoint="values.batchClear", range=a1_range)
+
+def update_chunk(writer: ValuesBatchWriter, ws, start_row: int, start_col: int, values):
+    """Enfileira as linhas; o writer fatia pelo orçamento adaptativo e envia quando o lote enche."""
+    writer.add_rows(ws.title, start_row, start_col, values)
+
+# ===================== ESTADO ENTRE EXECUÇÕES =====================
+def source_fingerprint(folder: DriveFolder, file_id: str) -> str:
+    """Conteúdo do CSV (md5; modifiedTime se o Drive não der md5) + configuração que muda a saída."""
+    meta = next((f for f in folder.files if f.get("id") == file_id), {})
+    return fingerprint(file_id, meta.get("md5Checksum") or meta.get("modifiedTime"),
+                       DEST_SPREADSHEET_ID, DEST_WORKSHEET, MAX_COLS, TYPED_SINGLE_PASS)
+
+def open_destination(gc):
+    """(planilha, BD_Mensal, RESUMO) com uma só leitura de metadados; RESUMO é None se falhar."""
+    try:
+        sh = api_call(lambda: gc.open_by_key(DEST_SPREADSHEET_ID), "abertura do destino",
+                      kind=READ, endpoint="spreadsheets.get")
+        sheets = {w.title: w for w in api_call(sh.worksheets, "leitura das abas", kind=READ,
+                                                endpoint="spreadsheets.get")}
+        ws = sheets.get(DEST_WORKSHEET)
+        if ws is None:
+            print("🆕 Aba não existe. Criando…")
+            ws = api_call(lambda: sh.add_worksheet(title=DEST_WORKSHEET, rows=10, cols=MAX_COLS),
+                          f"criação de {DEST_WORKSHEET}", endpoint="spreadsheets.batchUpdate")
+    except Exception as e:
+        print(f"❌ Erro ao abrir destino: {e}")
+        sys.exit(1)
+    ws_resumo = sheets.get(RESUMO_WORKSHEET)
+    if ws_resumo is None:
         try:
-            return datetime(yyyy, mm, dd, hh, mi, ss)
-        except ValueError:
-            return None
-    return None
-
-def datetime_to_sheets_serial(dt: datetime) -> float:
-    base = datetime(1899, 12, 30)
-    delta = dt - base
-    return delta.days + (delta.seconds + delta.microseconds/1e6)/86400.0
-
-def to_float_br_us(val: str):
-    s = str(val).strip()
-    if s == "" or s.lower() in ("nan","none","null","-"):
+            ws_resumo = api_call(lambda: sh.add_worksheet(title=RESUMO_WORKSHEET, rows=10, cols=5),
+                                 f"criação de {RESUMO_WORKSHEET}", endpoint="spreadsheets.batchUpdate")
+        except Exception as e:
+            print(f"⚠️  Não foi possível criar {RESUMO_WORKSHEET}: {e}")
+    return sh, ws, ws_resumo
+
+# ===================== DIFERENCIAL =====================
+def manifest_key(num_cols: int) -> str:
+    return f"{DEST_SPREADSHEET_ID}|{DEST_WORKSHEET}|{num_cols}"
+
+def load_manifest_hashes(num_cols: int) -> Optional[List[str]]:
+    try:
+        manifest = json.loads(DIFF_MANIFEST.read_text(encoding="utf-8"))
+    except Exception:
         return None
-    s2 = re.sub(r"[^\d,\.\-]", "", s)
-    if s2 == "":
+    if manifest.get("key") != manifest_key(num_cols):
         return None
-    s2 = re.sub(r"\.(?=\d{3}(?:\D|$))", "", s2)
-    s2 = s2.replace(",", ".")
+    return manifest.get("hashes")
+
+def save_manifest_hashes(hashes: List[str], num_cols: int) -> None:
     try:
-        return float(s2)
-    except ValueError:
+        DIFF_MANIFEST.parent.mkdir(parents=True, exist_ok=True)
+        tmp = DIFF_MANIFEST.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"key": manifest_key(num_cols), "hashes": hashes}), encoding="utf-8")
+        tmp.replace(DIFF_MANIFEST)
+    except Exception as e:
+        print(f"⚠️  Não foi possível salvar o manifesto de hashes: {e}")
+
+def drop_manifest_hashes() -> None:
+    """O destino vai mudar: o manifesto deixa de descrevê-lo até o save_manifest_hashes do fim."""
+    DIFF_MANIFEST.unlink(missing_ok=True)
+
+def read_sheet_hashes(ws, num_cols: int) -> Optional[List[str]]:
+    """Hashes das linhas atuais de A:AK (valores crus). None se houver conteúdo além de num_cols."""
+    rows = api_call(lambda: ws.get(RANGE_CLEAR, value_render_option="UNFORMATTED_VALUE",
+                                   date_time_render_option="SERIAL_NUMBER"),
+                    f"leitura {RANGE_CLEAR}", kind=READ, endpoint="values.get", range=RANGE_CLEAR)
+    if any(cell_key(v) for row in rows for v in row[num_cols:]):
+        return None  # colunas sobrando à direita: só a limpeza total garante o mesmo resultado
+    return row_hashes(rows, num_cols)
+
+def plan_diff(ws, new_hashes: List[str], num_cols: int) -> Optional[Tuple[List[Tuple[int, int]], int]]:
+    """(trechos alterados, nº de linhas anteriores) ou None quando o caminho é regravar tudo."""
+    if DIFF_SOURCE == "manifest":
+        old = load_manifest_hashes(num_cols)
+    else:
+        try:
+            old = read_sheet_hashes(ws, num_cols)
+        except Exception as e:
+            print(f"⚠️  Não consegui ler BD_Mensal para o diferencial: {e}")
+            old = None
+    if old is None:
+        print("ℹ️ Diferencial indisponível (sem base anterior compatível) → regravação completa.")
+        return None
+    blocks = diff_blocks(old, new_hashes, merge_gap=DIFF_MERGE_GAP)
+    changed = sum(end - start for start, end in blocks)
+    print(f"🧬 Diferencial: {changed} de {len(new_hashes)} linhas a regravar em {len(blocks)} trecho(s)"
+          f"; linhas anteriores: {len(old)}")
+    if changed > DIFF_MAX_RATIO * max(len(new_hashes), 1):
+        print(f"ℹ️ Mudança acima de {DIFF_MAX_RATIO:.0%} → regravação completa.")
         return None
+    return blocks, len(old)
 
 # ===================== TIMESTAMP RESUMO (A2, dd/mm/yyyy HH:mm) =====================
-def gravar_timestamp_resumo(sh):
-    """Grava timestamp em RESUMO!A2 no formato dd/mm/yyyy HH:mm (America/Sao_Paulo), sem segundos."""
+def trim_ranges(total_rows: int, num_cols: int) -> List[str]:
+    """Sobras de uma base anterior maior: linhas abaixo de total_rows e colunas além de num_cols."""
+    last_col = RANGE_CLEAR.split(":")[1]
+    out = [f"A{total_rows + 1}:{last_col}"]
+    if 0 < num_cols < MAX_COLS and total_rows:
+        out.append(f"{gspread.utils.rowcol_to_a1(1, num_cols + 1)}:{last_col}{total_rows}")
+    return out
+
+def gravar_formatos_e_timestamp(sh, ws, ws_resumo, num_cols: int = 0, trim: Optional[List[str]] = None):
+    """
+    Limpa as sobras em `trim` (WRITE_THEN_TRIM), formata as colunas de data (A, D, AK, até num_cols)
+    e grava o timestamp em RESUMO!A2 (dd/mm/yyyy HH:mm, America/Sao_Paulo, sem segundos) numa
+    única spreadsheets.batchUpdate. Falha só é fatal quando há sobras a limpar.
+    """
     ts = (datetime.now(TZ) if TZ else datetime.now()).strftime("%d/%m/%Y %H:%M")
+    reqs = SheetRequests(sh, call=api_call)
+    for rng in trim or []:
+        reqs.clear_values(ws, rng)
+    for idx, letter in DATE_FORMAT_COLS.items():
+        if idx <= num_cols:
+            reqs.number_format(ws, f"{letter}:{letter}", "DATE", "dd/mm/yyyy")
+    if ws_resumo is not None:
+        reqs.set_value(ws_resumo, "A2", ts, number_format=("DATE_TIME", "dd/mm/yyyy HH:mm"))
     try:
-        try:
-            ws_resumo = sh.worksheet("RESUMO")
-        except WorksheetNotFound:
-            ws_resumo = sh.add_worksheet(title="RESUMO", rows=10, cols=5)
-        # gspread 6.x — sempre 2D + range_name
-        safe_call(lambda: ws_resumo.update([[ts]], range_name="A2", value_input_option="RAW"),
-                  "atualizar RESUMO!A2")
-        # (opcional) formatar A2 como data+hora sem segundos
-        if HAS_FMT:
-            try:
-                fmt = CellFormat(numberFormat=NumberFormat(type="DATE_TIME", pattern="dd/mm/yyyy HH:mm"))
-                format_cell_range(ws_resumo, "A2", fmt)
-            except Exception:
-                pass
-        print(f"🕒 RESUMO!A2 atualizado com '{ts}'.")
+        reqs.execute("sobras + formatos + RESUMO!A2" if trim else "formatos + RESUMO!A2")
     except Exception as e:
-        print(f"⚠️  Não foi possível atualizar RESUMO!A2: {e}")
+        if trim:
+            raise
+        print(f"⚠️  Não foi possível aplicar formatos / atualizar RESUMO!A2: {e}")
+        return
+    if ws_resumo is not None:
+        print(f"🕒 RESUMO!A2 atualizado com '{ts}'.")
 
 # ===================== MAIN =====================
 def main():
@@ -224,51 +288,47 @@ def main():
     print("✅ Autenticado.\n")
 
     print("🔎 Buscando 'Historico_Mensal.csv' na pasta do Drive…")
-    res = get_latest_csv_from_folder(drive, FOLDER_ID, CSV_NAME)
+    folder = DriveFolder(drive, FOLDER_ID, call=SCHEDULER.caller(DRIVE))
+    res = get_latest_csv_from_folder(folder, CSV_NAME)
     if not res:
         print("❌ Não encontrei 'Historico_Mensal.csv' na pasta informada.")
         sys.exit(1)
     file_id, mtime = res
     print(f"📝 Arquivo encontrado. Última modificação: {mtime}")
 
-    print("📥 Baixando CSV…")
-    content = download_file_content(drive, file_id)
-    print(f"✅ {len(content)} bytes baixados.\n")
-
-    # ===== Leitura do CSV =====
-    df = None
-    try:
-        df = pd.read_csv(
-            io.BytesIO(content),
-            sep=None, engine="python",
-            dtype=str, encoding="utf-8-sig",
-            keep_default_na=False, na_filter=False,
-        )
-    except Exception:
-        df = None
-
-    if df is None or df.shape[1] == 1:
-        for sep in [";", ","]:
-            try:
-                tmp = pd.read_csv(
-                    io.BytesIO(content),
-                    sep=sep, dtype=str, encoding="utf-8-sig",
-                    keep_default_na=False, na_filter=False,
-                )
-                if tmp.shape[1] == 1 and sep == ";":
-                    continue
-                df = tmp
-                break
-            except Exception:
-                df = None
+    state = RunState()
+    source_fp = source_fingerprint(folder, file_id)
+    if SKIP_IF_UNCHANGED and state.unchanged(STATE_STEP, source_fp):
+        last = state.last(STATE_STEP) or {}
+        print(f"⏭️  Mesmo conteúdo da última importação ({last.get('synced_at', '?')}). "
+              f"Só atualizando RESUMO!A2.")
+        sh, ws, ws_resumo = open_destination(gc)
+        gravar_formatos_e_timestamp(sh, ws, ws_resumo)
+        print("\n✅ Concluído (origem sem mudanças).")
+        return
 
+    # ===== Leitura (Parquet tipado, se houver; senão CSV) =====
+    df = read_parquet_sidecar(folder, mtime) if PREFER_PARQUET else None
     if df is None:
-        print("❌ Falha ao ler o CSV.")
-        sys.exit(1)
+        df = read_csv_historico(drive, file_id)
 
     if df.shape[1] > MAX_COLS:
         df = df.iloc[:, :MAX_COLS]
 
+    # colunas que já vieram tipadas do Parquet: valor final da planilha já aqui, sem reconversão
+    typed_cols = {idx for idx, col in enumerate(df.columns, start=1) if df[col].dtype != object}
+    if typed_cols:
+        df = df.assign(**{df.columns[c - 1]: df.iloc[:, c - 1].map(sheets_value).astype(object)
+                          for c in typed_cols})
+
+    if TYPED_SINGLE_PASS:
+        pending = [c for c in sorted(COLS_DATE | COLS_NUM) if c <= df.shape[1] and c not in typed_cols]
+        if pending:
+            df = df.assign(**{df.columns[c - 1]: convert_column(df.iloc[:, c - 1], column_kind(c))
+                              for c in pending})
+            typed_cols |= set(pending)
+            print(f"🧮 Convertidas em memória (data/número): colunas {', '.join(map(str, pending))}")
+
     headers = list(df.columns)
     num_cols = min(df.shape[1], MAX_COLS)
 
@@ -282,80 +342,117 @@ def main():
     data = [header_row] + data_rows
 
     print(f"\n📂 Abrindo destino: {DEST_SPREADSHEET_ID} › {DEST_WORKSHEET}")
-    try:
-        sh = gc.open_by_key(DEST_SPREADSHEET_ID)
-        try:
-            ws = sh.worksheet(DEST_WORKSHEET)
-        except WorksheetNotFound:
-            print("🆕 Aba não existe. Criando…")
-            ws = sh.add_worksheet(title=DEST_WORKSHEET, rows=10, cols=MAX_COLS)
-    except Exception as e:
-        print(f"❌ Erro ao abrir destino: {e}")
-        sys.exit(1)
+    sh, ws, ws_resumo = open_destination(gc)
 
     total_rows = len(data)
     print(f"📏 Linhas (inclui cabeçalho): {total_rows} | Colunas: {num_cols}")
 
-    print("🧹 Limpando A:AK (somente conteúdo)…")
-    batch_clear(ws, RANGE_CLEAR)
+    use_diff = DIFF_SYNC and TYPED_SINGLE_PASS
+    new_hashes = row_hashes(data, num_cols) if use_diff else None
+
+    # retentativa desta execução com a mesma origem: mesmo plano (sem reler BD_Mensal para o
+    # diferencial nem limpar de novo), pulando as linhas que a tentativa anterior já gravou
+    journal = Journal(STATE_STEP, fingerprint(source_fp, headers, sorted(typed_cols), use_diff,
+                                              TYPED_SINGLE_PASS, WRITE_THEN_TRIM))
+    resumed = journal.resume()
+
+    trim = None  # sobras limpas no fim (WRITE_THEN_TRIM), junto com formatos e timestamp
+    if resumed is not None:
+        blocks = [tuple(b) for b in resumed["blocks"]]
+        trim = resumed.get("trim")
+        done = resumed.get("rows", 0)
+        print(f"↩️  Retomando tentativa anterior: {done} linha(s) já gravadas nesta execução.")
+    else:
+        plan = plan_diff(ws, new_hashes, num_cols) if use_diff else None
+        # a partir daqui BD_Mensal deixa de ser a última cópia: estado e manifesto só voltam a
+        # valer depois da limpeza final (uma tentativa interrompida não pode deixar a próxima pular)
+        state.invalidate(STATE_STEP)
+        drop_manifest_hashes()
+        if plan is None:
+            blocks = [(0, total_rows)]
+            if WRITE_THEN_TRIM:
+                trim = trim_ranges(total_rows, num_cols)
+                print(f"✍️ Sobrescrevendo A:AK no lugar; sobras ({', '.join(trim)}) limpas no fim.")
+            else:
+                print("🧹 Limpando A:AK (somente conteúdo)…")
+                batch_clear(ws, RANGE_CLEAR)
+        else:
+            blocks, old_rows = plan
+            if old_rows > total_rows:
+                tail = f"A{total_rows + 1}:{RANGE_CLEAR.split(':')[1]}"
+                if WRITE_THEN_TRIM:
+                    trim = [tail]
+                    print(f"✂️  Base encolheu: cauda {tail} limpa no fim.")
+                else:
+                    print(f"🧹 Base encolheu: limpando só a cauda {tail}…")
+                    batch_clear(ws, tail)
+        done = 0
+        journal.save(blocks=blocks, trim=trim, rows=0)
+
+    planned = sum(b_end - b_start for b_start, b_end in blocks)
+
+    def checkpoint(w: ValuesBatchWriter):
+        # blocos enviados na ordem do plano: as primeiras done + rows_sent linhas estão gravadas
+        journal.save(blocks=blocks, trim=trim, rows=min(done + w.rows_sent, planned))
+
+    writer = ValuesBatchWriter(sh, value_input_option=VALUE_INPUT_OPTION_RAW, call=api_call,
+                               on_flush=checkpoint)
 
     ensure_min_rows(ws, max(total_rows, 50))
 
-    print("🚀 Colando conteúdo (1:1 do CSV)…")
+    print("🚀 Colando conteúdo" + (" (já tipado)…" if typed_cols else " (1:1 do CSV)…"))
     start = 1
-    for i in range(0, total_rows, CHUNK_ROWS):
-        chunk = data[i : i + CHUNK_ROWS]
-        print(f"   • Linhas {i+1}–{i+len(chunk)}")
-        update_chunk(ws, start_row=start + i, start_col=1,
-                     values=chunk, value_input_option=VALUE_INPUT_OPTION_RAW)
+    skip = done
+    for b_start, b_end in blocks:
+        if skip >= b_end - b_start:
+            skip -= b_end - b_start
+            continue
+        b_start, skip = b_start + skip, 0
+        print(f"   • Linhas {b_start+1}–{b_end}")
+        update_chunk(writer, ws, start_row=start + b_start, start_col=1, values=data[b_start:b_end])
+    if not blocks:
+        print("   • Nenhuma linha mudou desde a última execução.")
 
     # ===== Conversões seletivas =====
     n_rows = len(data_rows)  # sem cabeçalho
     if n_rows == 0:
         print("ℹ️ Sem linhas de dados; nada para converter.")
-        gravar_timestamp_resumo(sh)
+        writer.flush()
+        gravar_formatos_e_timestamp(sh, ws, ws_resumo, trim=trim)
+        if use_diff:
+            save_manifest_hashes(new_hashes, num_cols)
+        state.record(STATE_STEP, source_fp, file_id=file_id, rows=0)
+        journal.clear()
         print("\n✅ Concluído.")
         return
 
     def update_col_from_list(col_idx_1based: int, values_list):
         col_matrix = [[x] for x in values_list]
-        update_chunk(ws, start_row=2, start_col=col_idx_1based,
-                     values=col_matrix, value_input_option=VALUE_INPUT_OPTION_RAW)
+        update_chunk(writer, ws, start_row=2, start_col=col_idx_1based, values=col_matrix)
 
     for c in sorted(COLS_DATE):
-        if c > num_cols:
+        if c > num_cols or c in typed_cols:
             continue
-        col_vals = [row[c-1] for row in data_rows]
-        converted = []
-        for v in col_vals:
-            dt = parse_to_datetime(v)
-            converted.append(datetime_to_sheets_serial(dt) if dt else v)
-        update_col_from_list(c, converted)
+        col_vals = pd.Series([row[c-1] for row in data_rows], dtype=object)
+        update_col_from_list(c, convert_column(col_vals, "date").tolist())
         print(f"📅 Coluna {c} (data) convertida onde possível.")
 
     for c in sorted(COLS_NUM):
-        if c > num_cols:
+        if c > num_cols or c in typed_cols:
             continue
-        col_vals = [row[c-1] for row in data_rows]
-        conv = []
-        for v in col_vals:
-            f = to_float_br_us(v)
-            conv.append(f if f is not None else v)
-        update_col_from_list(c, conv)
+        col_vals = pd.Series([row[c-1] for row in data_rows], dtype=object)
+        update_col_from_list(c, convert_column(col_vals, "num").tolist())
         print(f"🔢 Coluna {c} (número) convertida onde possível.")
 
-    if HAS_FMT:
-        try:
-            fmt_date = CellFormat(numberFormat=NumberFormat(type="DATE", pattern="dd/mm/yyyy"))
-            col_letters = {1: "A", 4: "D", 37: "AK"}
-            for idx, letter in col_letters.items():
-                if idx <= num_cols:
-                    format_cell_range(ws, f"{letter}:{letter}", fmt_date)
-        except Exception as e:
-            print(f"⚠️  Não consegui aplicar formatação de data: {e}")
-
-    gravar_timestamp_resumo(sh)
-    print("\n✅ Concluído! A:AK limpo e colado; **AG preservada**; só A, D, AK (data) e E, L..Y (número) convertidas.")
+    writer.flush()
+    gravar_formatos_e_timestamp(sh, ws, ws_resumo, num_cols, trim=trim)
+    if use_diff:
+        save_manifest_hashes(new_hashes, num_cols)
+    state.record(STATE_STEP, source_fp, file_id=file_id, rows=n_rows)
+    journal.clear()
+    print(f"📨 {writer.ranges_sent} intervalos enviados em {writer.requests} batchUpdate(s).")
+    print(f"📊 Cotas: {SCHEDULER.summary()}")
+    print("\n✅ Concluído! A:AK colado; **AG preservada**; só A, D, AK (data) e E, L..Y (número) convertidas.")
 
 if __name__ == "__main__":
     try:
@@ -3,18 +3,37 @@
 Replica A:AN da aba BD_Carteira (linha 3 em diante, incluindo o cabeçalho da linha 3)
 para a aba Base_Esteira em OUTRA planilha, colando em A2.
 - Sem conversão manual (sem "tratar apóstrofos"): lê valores já nativos (número/serial)
-- Limpa A:AN do destino
+- Sobrescreve A:AN no lugar e só depois limpa o que sobrou abaixo/à direita (WRITE_THEN_TRIM)
 - Logs de cada etapa (leitura, limpeza, escrita, ETA)
+- Cabeçalho, blocos e o status final em A1 vão em spreadsheets.values.batchUpdate multi-intervalo
+- Sem WRITE_THEN_TRIM: limpeza + status "Em execução" em A1 numa única spreadsheets.batchUpdate
+- Se o conteúdo lido é igual ao da última cópia bem-sucedida (oea_estado.py), só o status é atualizado
+- Journal por execução: se uma tentativa cai no meio, a próxima pula os lotes já gravados (conferidos
+  pelo digest do conteúdo) e continua dali
+- Modo streaming: a origem é lida em janelas de linhas por uma thread produtora (fila limitada) e
+  cada janela é gravada enquanto a próxima é baixada — tempo ~ max(leitura, escrita), memória de
+  uma ou duas janelas
+- Modo servidor (opcional): sheets.copyTo da aba de origem para a planilha de destino + copyPaste
+  PASTE_VALUES em A2 + exclusão da cópia, sem os dados passarem pelo runner; se falhar, caminho cliente
 """
 
+import contextvars
+import hashlib
+import queue
 import sys
+import threading
 import time
 from datetime import datetime
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
 
 import gspread
-from google.oauth2.service_account import Credentials
 from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol, absolute_range_name, rowcol_to_a1
+
+from oea_api import READ, SCHEDULER, WRITE, api_call
+from oea_clientes import credentials, gspread_client
+from oea_estado import Journal, RunState, fingerprint
+from oea_sheets import ValuesBatchWriter, SheetRequests, row_hashes
 
 # ====== CONFIG ======
 CAMINHO_CRED = "credenciais.json"
@@ -28,42 +47,39 @@ ABA_DESTINO = "Base_Esteira"
 COL_INICIO  = "A"
 COL_FIM     = "AN"
 
-CHUNK_ROWS  = 8000   # ajuste se quiser
 
-MAX_API_RETRIES = 6
-BASE_SLEEP = 2.0
-# =====================
+# Não regrava o destino quando a origem lida é idêntica à da última cópia bem-sucedida.
+# A comparação é pelo conteúdo (hash por linha): o modifiedTime da planilha de origem não
+# acompanha recálculo de fórmulas/IMPORTRANGE.
+SKIP_IF_UNCHANGED = True
+STATE_STEP = "esteira"
 
-def safe_call(fn, desc="chamada API"):
-    """Retry com backoff linear em erros transientes 5xx / 429 da API Google."""
-    for i in range(1, MAX_API_RETRIES + 1):
-        try:
-            return fn()
-        except APIError as e:
-            status = getattr(getattr(e, "response", None), "status_code", None)
-            if status not in (429, 500, 502, 503, 504) or i == MAX_API_RETRIES:
-                raise
-            wait = BASE_SLEEP * i
-            print(f"⚠️  {desc} falhou ({status}). Tentativa {i}/{MAX_API_RETRIES}. Aguardando {wait:.1f}s…")
-            time.sleep(wait)
-        except OSError as e:
-            # erros de rede/conexao (requests herda de OSError) — transientes
-            if i == MAX_API_RETRIES:
-                raise
-            wait = BASE_SLEEP * i
-            print(f"⚠️  Erro de rede na {desc}: {e}. Tentativa {i}/{MAX_API_RETRIES}. Aguardando {wait:.1f}s…")
-            time.sleep(wait)
-    raise RuntimeError(f"Falhou após {MAX_API_RETRIES} tentativas: {desc}")
+# Leitura em janelas de linhas por uma thread produtora; a gravação de uma janela corre em
+# paralelo com o download da próxima. PIPELINE_DEPTH = janelas lidas à frente (fila limitada).
+# STREAMING = False volta à leitura de A4:AN inteiro antes de gravar.
+STREAMING = True
+READ_WINDOW_ROWS = 5000
+PIPELINE_DEPTH = 2
+
+# Cópia feita pelo próprio Google: copyTo da aba inteira para a planilha de destino e copyPaste
+# PASTE_VALUES de A3:AN da cópia em A2. O conteúdo não é lido (não há skip-if-unchanged) e fórmulas
+# que apontam para outras abas/IMPORTRANGE quebram na cópia — a amostra conferida antes de colar
+# (cabeçalho + 1ª linha) pega esse caso e o script volta para o caminho cliente.
+SERVER_SIDE = False
+
+# Publica sobrescrevendo no lugar: a aba nunca fica vazia durante o upload e as fórmulas que
+# dependem dela recalculam uma vez, não duas. As sobras (linhas abaixo da última nova, colunas
+# além do cabeçalho) são limpas no fim, junto com o status final. False = limpa A:AN antes.
+WRITE_THEN_TRIM = True
+
+# =====================
 
 def auth():
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive",
     ]
-    creds = Credentials.from_service_account_file(CAMINHO_CRED, scopes=scopes)
-    gc = gspread.authorize(creds)
-    gc.set_timeout(60)  # falha rapido em call travada; safe_call faz o backoff
-    return gc
+    return gspread_client(credentials(CAMINHO_CRED, scopes))
 
 def a1_range(c1, r1, c2, r2):
     return f"{c1}{r1}:{c2}{r2}"
@@ -71,7 +87,8 @@ def a1_range(c1, r1, c2, r2):
 def normalize_width(rows: List[List], total_cols: int) -> List[List]:
     out = []
     for r in rows:
-        r = list(r)
+        # None iria como null, que a API ignora (a célula antiga ficaria lá); "" apaga
+        r = ["" if c is None else c for c in r]
         if len(r) < total_cols:
             r += [""] * (total_cols - len(r))
         elif len(r) > total_cols:
@@ -79,9 +96,146 @@ def normalize_width(rows: List[List], total_cols: int) -> List[List]:
         out.append(r)
     return out
 
+def get_values(ws, rng: str, desc: str) -> List[List]:
+    """Intervalo como valores nativos (número/serial); gspread antigo → sem parâmetros de renderização."""
+    try:
+        return api_call(lambda: ws.get(
+            rng,
+            value_render_option="UNFORMATTED_VALUE",
+            date_time_render_option="SERIAL_NUMBER",
+        ), desc, kind=READ, endpoint="values.get", range=rng)
+    except TypeError:
+        print("ℹ️ gspread antigo → fallback sem parâmetros de renderização.")
+        return api_call(lambda: ws.get(rng), desc, kind=READ, endpoint="values.get", range=rng)
+
+def is_empty_row(row) -> bool:
+    return all((c == "" or c is None) for c in row)
+
+def read_windows(ws, last_row: int) -> Iterator[Tuple[List[List], int]]:
+    """(linhas, nº de linhas da janela) de A4 até last_row; a API corta as vazias do fim de cada janela."""
+    r = 4
+    while r <= last_row:
+        end = min(r + READ_WINDOW_ROWS - 1, last_row)
+        rows = get_values(ws, a1_range(COL_INICIO, r, COL_FIM, end), f"leitura linhas {r}-{end}")
+        yield rows, end - r + 1
+        r = end + 1
+
+def prefetch(make_iter, depth: int) -> Iterator:
+    """
+    Consome make_iter() numa thread produtora, até `depth` itens à frente (fila limitada).
+    Erro do produtor é relançado aqui; se o consumidor para (erro/fim), o produtor é encerrado.
+    """
+    q: queue.Queue = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for item in make_iter():
+                if not put(item):
+                    return
+            put(done)
+        except BaseException as e:  # repassado ao consumidor
+            put(e)
+
+    # no contexto da etapa: o orquestrador in-process roteia log/prefixo/telemetria por ContextVars
+    t = threading.Thread(target=contextvars.copy_context().run, args=(worker,), name="leitura-origem",
+                         daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+def data_batches(windows: Iterable[Tuple[List[List], int]], total_cols: int) -> Iterator[List[List]]:
+    """
+    Linhas de dados em ordem, iguais à leitura inteira: linhas vazias no meio são mantidas,
+    as do fim são descartadas (só saem quando aparece uma linha com conteúdo depois delas).
+    """
+    pending_empty = 0
+    for rows, n_rows in windows:
+        out = []
+        for row in rows:
+            if is_empty_row(row):
+                pending_empty += 1
+                continue
+            out.extend([""] * total_cols for _ in range(pending_empty))
+            pending_empty = 0
+            out.append(row)
+        pending_empty += n_rows - len(rows)
+        if out:
+            yield normalize_width(out, total_cols) if total_cols else out
+
+def replicate_server_side(ws_src, sh_dst, ws_dst, n_cols: int, status: str) -> int:
+    """
+    Copia a aba de origem para a planilha de destino (sheets.copyTo), confere uma amostra e, numa
+    única batchUpdate, limpa A:AN, cola A3:<fim> da cópia em A2 como valores, grava o status e
+    apaga a cópia. Retorna o nº de linhas coladas (cabeçalho incluso).
+    """
+    c0 = a1_to_rowcol(f"{COL_INICIO}1")[1] - 1
+    n_cols = n_cols or a1_to_rowcol(f"{COL_FIM}1")[1] - c0
+    print(f"📑 Copiando {ABA_ORIGEM} para a planilha de destino (sheets.copyTo)…")
+    # sem retentativa: se a cópia for feita e a resposta se perder, repetir deixaria uma segunda
+    # aba temporária no destino (a falha cai no caminho cliente)
+    wait_s = SCHEDULER.wait_turn(WRITE)
+    t0 = time.perf_counter()
+    props = ws_src.copy_to(sh_dst.id)
+    SCHEDULER.trace(WRITE, "sheets.copyTo", "copyTo origem → destino", time.perf_counter() - t0, wait_s=wait_s)
+    tmp_id, tmp_title = props["sheetId"], props["title"]
+    try:
+        sample = a1_range(COL_INICIO, 3, COL_FIM, 4)
+        params = {"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "SERIAL_NUMBER"}
+        want = get_values(ws_src, sample, "amostra origem")
+        got = api_call(lambda: sh_dst.values_get(absolute_range_name(tmp_title, sample), params=params),
+                       "amostra cópia", kind=READ, endpoint="values.get", range=sample).get("values", [])
+        if normalize_width(got, n_cols) != normalize_width(want, n_cols):
+            raise RuntimeError("a cópia difere da origem (fórmula com referência a outra aba/planilha?)")
+
+        n_rows = max(props["gridProperties"]["rowCount"] - 2, 0)
+        reqs = SheetRequests(sh_dst, call=api_call)
+        reqs.clear_values(ws_dst, f"{COL_INICIO}:{COL_FIM}")
+        if n_rows:
+            source = {"sheetId": tmp_id, "startRowIndex": 2, "endRowIndex": 2 + n_rows,
+                      "startColumnIndex": c0, "endColumnIndex": c0 + n_cols}
+            reqs.copy_paste(source, ws_dst, f"{COL_INICIO}2")
+        reqs.set_value(ws_dst, "A1", status)
+        reqs.delete_sheet(tmp_id)
+        reqs.execute("limpeza + copyPaste + status")
+        return n_rows
+    except BaseException:
+        # a batchUpdate é atômica: se ela (ou a conferência) falhou, a cópia temporária ainda existe
+        try:
+            reqs = SheetRequests(sh_dst, call=api_call)
+            reqs.delete_sheet(tmp_id)
+            reqs.execute("remoção da cópia temporária")
+        except Exception as e:
+            print(f"⚠️ Não foi possível apagar a aba temporária '{tmp_title}': {e}")
+        raise
+
+def open_worksheet(gc, key: str, title: str):
+    sh = api_call(lambda: gc.open_by_key(key), f"abertura de {key}", kind=READ, endpoint="spreadsheets.get")
+    return sh, api_call(lambda: sh.worksheet(title), f"abertura da aba {title}", kind=READ,
+                        endpoint="spreadsheets.get")
+
 def set_status(ws, text):
     try:
-        ws.update([[text]], "A1", raw=True)
+        api_call(lambda: ws.update([[text]], "A1", raw=True), "escrita do status em A1",
+                 endpoint="values.update", range="A1", rows_out=1, cells_out=1)
     except Exception as e:
         print(f"⚠️ Falha ao escrever status em A1: {e}")
 
@@ -91,103 +245,213 @@ def main():
     gc = auth()
     print(f"✅ Autenticado. gspread={gspread.__version__}\n")
 
-    sh_src = gc.open_by_key(ID_ORIGEM)
-    sh_dst = gc.open_by_key(ID_DESTINO)
-    ws_src = sh_src.worksheet(ABA_ORIGEM)
-    ws_dst = sh_dst.worksheet(ABA_DESTINO)
+    sh_src, ws_src = open_worksheet(gc, ID_ORIGEM, ABA_ORIGEM)
+    sh_dst, ws_dst = open_worksheet(gc, ID_DESTINO, ABA_DESTINO)
 
     print(f"📂 Origem: {ID_ORIGEM} › {ABA_ORIGEM}")
     print(f"📂 Destino: {ID_DESTINO} › {ABA_DESTINO}")
 
-    # Sinal imediato de vida no destino
-    set_status(ws_dst, "⏱️ Em execução...")
-
     # -------- LEITURA --------
     t_read0 = time.time()
     print("📥 Lendo cabeçalho (A3:AN3) como valores nativos…")
-    try:
-        header_rows = safe_call(lambda: ws_src.get(
-            f"{COL_INICIO}3:{COL_FIM}3",
-            value_render_option="UNFORMATTED_VALUE",
-            date_time_render_option="SERIAL_NUMBER",
-        ), "leitura cabeçalho")
-    except TypeError:
-        print("ℹ️ gspread antigo → fallback sem parâmetros de renderização.")
-        header_rows = safe_call(lambda: ws_src.get(f"{COL_INICIO}3:{COL_FIM}3"), "leitura cabeçalho")
+    header_rows = get_values(ws_src, f"{COL_INICIO}3:{COL_FIM}3", "leitura cabeçalho")
     header = header_rows[0] if header_rows else []
     total_cols = len(header) if header else 0
 
-    print("📥 Lendo dados (A4:AN) como valores nativos…")
-    try:
-        data = safe_call(lambda: ws_src.get(
-            f"{COL_INICIO}4:{COL_FIM}",
-            value_render_option="UNFORMATTED_VALUE",
-            date_time_render_option="SERIAL_NUMBER",
-        ), "leitura dados")
-    except TypeError:
-        data = safe_call(lambda: ws_src.get(f"{COL_INICIO}4:{COL_FIM}"), "leitura dados")
+    if SERVER_SIDE:
+        t_srv0 = time.time()
+        try:
+            n = replicate_server_side(ws_src, sh_dst, ws_dst, total_cols,
+                                      datetime.now().strftime("Atualizado em: %d/%m/%Y %H:%M:%S"))
+            # destino mudou sem o conteúdo ser lido: o estado do caminho cliente deixa de valer
+            RunState().record(STATE_STEP, "", mode="servidor", rows=n)
+            print(f"✅ {n} linhas coladas no servidor. ⏱️ {time.time() - t_srv0:.2f}s")
+            print(f"\n🟢 Concluído (modo servidor). ⏱️ total: {time.time() - t0:.2f}s")
+            return
+        except Exception as e:
+            print(f"⚠️ Modo servidor falhou ({e}). Seguindo pelo caminho cliente…")
+
+    if STREAMING:
+        last_row = ws_src.row_count
+        print(f"📥 Lendo dados (A4:AN{last_row}) em janelas de {READ_WINDOW_ROWS} linhas"
+              f" (até {PIPELINE_DEPTH} à frente da gravação)…")
+
+        def source_windows():
+            # cliente próprio na thread produtora (a sessão HTTP do gspread não é thread-safe)
+            _, ws = open_worksheet(auth(), ID_ORIGEM, ABA_ORIGEM)
+            return read_windows(ws, last_row)
 
-    # Remove linhas 100% vazias ao final
-    while data and all((c == "" or c is None) for c in data[-1]):
-        data.pop()
+        batches = data_batches(prefetch(source_windows, PIPELINE_DEPTH), total_cols)
+    else:
+        print("📥 Lendo dados (A4:AN) como valores nativos…")
+        data = get_values(ws_src, f"{COL_INICIO}4:{COL_FIM}", "leitura dados")
+        print(f"🔎 Linhas lidas: {len(data)} | ⏱️ leitura: {time.time() - t_read0:.2f}s")
+        batches = data_batches([(data, len(data))], total_cols)
+
+    # -------- ESTADO --------
+    # digest cumulativo do conteúdo (hash por linha), guardado ao fim de cada lote. Enquanto os
+    # lotes batem com os da última cópia, as linhas já estão no destino e nada é gravado; na
+    # primeira diferença o destino é limpo dali para baixo e o resto segue em streaming. Se bater
+    # até o fim, só o status é atualizado (mesma premissa do SKIP_IF_UNCHANGED).
+    state = RunState()
+    last = state.last(STATE_STEP) or {}
+    layout = READ_WINDOW_ROWS if STREAMING else 0
+    prev_prefixes = last.get("prefixes") or []
+    if not SKIP_IF_UNCHANGED or state.forced() or last.get("layout") != layout:
+        prev_prefixes = []
+    elif RunState.interrupted(last):
+        # uma escrita parou no meio depois da última cópia: o destino não bate mais com ela
+        print("⚠️  Última gravação interrompida: ignorando os lotes da cópia anterior.")
+        prev_prefixes = []
+    # retentativa desta execução: o journal diz quais lotes a tentativa anterior deixou gravados
+    # (no destino até ali, e só até ali — depois disso a última cópia bem-sucedida não vale mais)
+    journal = Journal(STATE_STEP, fingerprint(ID_ORIGEM, ABA_ORIGEM, ID_DESTINO, ABA_DESTINO,
+                                              COL_INICIO, COL_FIM, layout, WRITE_THEN_TRIM, header))
+    resumed = journal.resume()
+    if resumed is not None:
+        prev_prefixes = resumed.get("prefixes") or []
+        print(f"↩️  Retomando tentativa anterior: {len(prev_prefixes)} lote(s) já gravados nesta execução.")
+    digest = hashlib.sha256()
+    for h in row_hashes([header], total_cols):
+        digest.update(h.encode())
+    prefixes: List[str] = []
+
+    # -------- ESCRITA --------
+    # tudo enfileirado no writer; o tamanho de cada batchUpdate segue o orçamento adaptativo
+    est_start = time.time()
 
-    if header:
-        total_cols = len(header)
-        data = normalize_width(data, total_cols)
+    start_row, start_col = gspread.utils.a1_to_rowcol(f"{COL_INICIO}3")
+    next_row = start_row
+    writing = False
+    write_from = start_row  # 1ª linha de dados gravada nesta tentativa
+    preamble = 0            # linhas enfileiradas antes dos dados (status, cabeçalho)
+    batch_ends: List[int] = []  # linha seguinte ao fim de cada lote
 
-    t_read1 = time.time()
-    print(f"🔎 Linhas lidas: {len(data)} (sem contar cabeçalho) | Colunas: {total_cols} | ⏱️ leitura: {t_read1 - t_read0:.2f}s")
+    def progresso(w: ValuesBatchWriter):
+        done = max(w.rows_sent - preamble, 0)
+        elapsed = time.time() - est_start
+        rate = done/elapsed if elapsed > 0 else 0
+        print(f"     Progresso: {done} linhas | Velocidade: {rate:.1f} l/s"
+              f" | orçamento ~{w.budget / 1024:.0f} KB")
+        # o writer envia na ordem em que enfileirou: tudo antes de write_from + done está gravado
+        committed = write_from + done
+        journal.save(prefixes=prefixes[:sum(1 for end in batch_ends if end <= committed)])
 
-    if not header and not data:
+    writer = ValuesBatchWriter(sh_dst, value_input_option="RAW", call=api_call, on_flush=progresso)
+    # sem cabeçalho as linhas não são normalizadas (larguras variadas): só a limpeza prévia é segura
+    trim = WRITE_THEN_TRIM and total_cols > 0
+
+    def start_writing():
+        nonlocal est_start, write_from, preamble
+        full = next_row == start_row
+        write_from = next_row
+        # a partir daqui o destino deixa de ser a última cópia: o journal passa a valer e o estado
+        # salvo só volta a valer no state.record do fim
+        journal.save(prefixes=prefixes[:sum(1 for end in batch_ends if end <= next_row)])
+        state.invalidate(STATE_STEP)
+        if trim:
+            est_start = time.time()
+            writer.add(ws_dst.title, "A1", [["⏱️ Em execução..."]])
+            preamble = 1
+            if full and header:
+                print("✍️ Gravando cabeçalho em A2…")
+                writer.add(ws_dst.title, a1_range(COL_INICIO, 2, COL_FIM, 2), [header])
+                preamble += 1
+            if not full:
+                print(f"↪️  Linhas até {next_row - 1} já estão no destino; gravando a partir da {next_row}.")
+            print("🚚 Sobrescrevendo linhas no lugar (blocos pelo orçamento de bytes)…")
+            return
+        target = f"{COL_INICIO}:{COL_FIM}" if full else f"{COL_INICIO}{next_row}:{COL_FIM}"
+        print(f"🧹 Limpando destino ({target})…")
+        t_clear0 = time.time()
+        try:
+            # a limpeza apaga A1; o status "em execução" vai logo depois, na mesma chamada
+            reqs = SheetRequests(sh_dst, call=api_call)
+            reqs.clear_values(ws_dst, target)
+            reqs.set_value(ws_dst, "A1", "⏱️ Em execução...")
+            reqs.execute("limpeza + status")
+        except APIError as e:
+            if not full:
+                raise  # clear() geral apagaria as linhas que não vão ser regravadas
+            print(f"⚠️ Limpeza falhou: {e}. Tentando clear() geral…")
+            api_call(lambda: ws_dst.clear(), "clear destino", endpoint="values.clear")
+        print(f"✅ Limpeza concluída. ⏱️ {time.time() - t_clear0:.2f}s")
+        est_start = time.time()
+        if full and header:
+            print("✍️ Gravando cabeçalho em A2…")
+            writer.add(ws_dst.title, a1_range(COL_INICIO, 2, COL_FIM, 2), [header])
+            preamble = 1
+        if not full:
+            print(f"↪️  Linhas até {next_row - 1} já estão no destino; gravando a partir da {next_row}.")
+        print("🚚 Gravando linhas (blocos pelo orçamento de bytes)…")
+
+    def write(rows: List[List]):
+        nonlocal next_row
+        writer.add_rows(ws_dst.title, next_row, start_col, rows)
+        next_row += len(rows)
+
+    for batch in batches:
+        for h in row_hashes(batch, total_cols):
+            digest.update(h.encode())
+        prefixes.append(digest.hexdigest())
+        batch_ends.append(next_row + len(batch))
+        if not writing:
+            i = len(prefixes) - 1
+            if i < len(prev_prefixes) and prev_prefixes[i] == prefixes[i]:
+                next_row += len(batch)  # já está no destino (última cópia ou tentativa anterior)
+                continue
+            start_writing()
+            writing = True
+        write(batch)
+
+    n_rows = next_row - start_row
+    print(f"🔎 Linhas de dados: {n_rows} (sem contar cabeçalho) | Colunas: {total_cols}"
+          f" | ⏱️ leitura{' + escrita' if writing else ''}: {time.time() - t_read0:.2f}s")
+
+    if not writing and not header and not n_rows:
         print("⚠️ Nada para copiar. Limpando destino e finalizando com timestamp.")
-        safe_call(lambda: ws_dst.batch_clear([f"{COL_INICIO}:{COL_FIM}"]), "batch_clear destino")
-        set_status(ws_dst, datetime.now().strftime("Atualizado em: %d/%m/%Y %H:%M:%S"))
+        state.invalidate(STATE_STEP)  # destino vazio: nenhuma cópia anterior continua valendo
+        reqs = SheetRequests(sh_dst, call=api_call)
+        reqs.clear_values(ws_dst, f"{COL_INICIO}:{COL_FIM}")
+        reqs.set_value(ws_dst, "A1", datetime.now().strftime("Atualizado em: %d/%m/%Y %H:%M:%S"))
+        reqs.execute("limpeza + status")
         print(f"🟢 Concluído (sem dados). ⏱️ total: {time.time() - t0:.2f}s")
         return
 
-    # -------- LIMPEZA DESTINO --------
-    t_clear0 = time.time()
-    print("🧹 Limpando destino (A:AN)…")
-    try:
-        safe_call(lambda: ws_dst.batch_clear([f"{COL_INICIO}:{COL_FIM}"]), "batch_clear destino")
-    except APIError as e:
-        print(f"⚠️ batch_clear falhou: {e}. Tentando clear() geral…")
-        safe_call(lambda: ws_dst.clear(), "clear destino")
-    t_clear1 = time.time()
-    print(f"✅ Limpeza concluída. ⏱️ {t_clear1 - t_clear0:.2f}s")
+    source_fp = fingerprint(ID_ORIGEM, ABA_ORIGEM, ID_DESTINO, ABA_DESTINO, COL_INICIO, COL_FIM,
+                            digest.hexdigest())
+    if not writing and SKIP_IF_UNCHANGED and state.unchanged(STATE_STEP, source_fp):
+        print(f"⏭️  Origem idêntica à da última cópia ({last.get('synced_at', '?')}). Só atualizando o status.")
+        set_status(ws_dst, datetime.now().strftime("Atualizado em: %d/%m/%Y %H:%M:%S"))
+        print(f"🟢 Concluído (origem sem mudanças). ⏱️ total: {time.time() - t0:.2f}s")
+        return
 
-    # -------- ESCRITA --------
-    if header:
-        print("✍️ Gravando cabeçalho em A2…")
-        safe_call(lambda: ws_dst.update([header], a1_range(COL_INICIO, 2, COL_FIM, 2), raw=True),
-                  "gravar cabeçalho")
-
-    if data:
-        total_rows = len(data)
-        print(f"🚚 Gravando {total_rows} linhas em blocos de {CHUNK_ROWS}…")
-        start = 0
-        row_cursor = 3
-        est_start = time.time()
-        while start < total_rows:
-            chunk = data[start:start + CHUNK_ROWS]
-            end_row = row_cursor + len(chunk) - 1
-            t_b0 = time.time()
-            safe_call(lambda: ws_dst.update(chunk, a1_range(COL_INICIO, row_cursor, COL_FIM, end_row), raw=True),
-                      f"gravar linhas {row_cursor}-{end_row}")
-            t_b1 = time.time()
-            print(f"   • Gravado {row_cursor}-{end_row} ({len(chunk)} linhas) | ⏱️ {t_b1 - t_b0:.2f}s")
-
-            start += CHUNK_ROWS
-            row_cursor = end_row + 1
-
-            done = min(start, total_rows)
-            elapsed = time.time() - est_start
-            rate = done/elapsed if elapsed > 0 else 0
-            remaining = (total_rows - done)/rate if rate > 0 else 0
-            print(f"     Progresso: {done}/{total_rows} | Velocidade: {rate:.1f} l/s | ETA ~ {remaining:.1f}s")
+    if not writing:
+        # origem encolheu (ou só o fim mudou para vazio): limpa o que sobrou depois da última linha
+        start_writing()
 
     # -------- TIMESTAMP --------
-    set_status(ws_dst, datetime.now().strftime("Atualizado em: %d/%m/%Y %H:%M:%S"))
+    status = datetime.now().strftime("Atualizado em: %d/%m/%Y %H:%M:%S")
+    if trim:
+        writer.flush()
+        # sobras da cópia anterior + status final numa única spreadsheets.batchUpdate
+        reqs = SheetRequests(sh_dst, call=api_call)
+        reqs.clear_values(ws_dst, f"B1:{COL_FIM}1")  # linha do status (a limpeza prévia também a zerava)
+        reqs.clear_values(ws_dst, f"{COL_INICIO}{next_row}:{COL_FIM}")
+        first_extra = a1_to_rowcol(f"{COL_INICIO}1")[1] + total_cols
+        if first_extra <= a1_to_rowcol(f"{COL_FIM}1")[1]:
+            reqs.clear_values(ws_dst, f"{rowcol_to_a1(2, first_extra)}:{COL_FIM}{max(next_row - 1, 2)}")
+        reqs.set_value(ws_dst, "A1", status)
+        reqs.execute("limpeza das sobras + status")
+        print(f"✂️  Sobras limpas a partir da linha {next_row}.")
+    else:
+        # status final vai no mesmo batchUpdate do último lote de dados
+        writer.add(ws_dst.title, "A1", [[status]])
+        writer.flush()
+    state.record(STATE_STEP, source_fp, rows=n_rows, layout=layout, prefixes=prefixes)
+    journal.clear()
+    print(f"📨 {writer.ranges_sent} intervalos enviados em {writer.requests} batchUpdate(s).")
+    print(f"📊 Cotas: {SCHEDULER.summary()}")
     print(f"\n🟢 Concluído. ⏱️ total: {time.time() - t0:.2f}s")
 
 if __name__ == "__main__":
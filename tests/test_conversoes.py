@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalência do motor de conversão por coluna (oea_conversoes) com a regra por célula.
+
+convert_column / date_parts / number_parts precisam dar, célula a célula, o mesmo resultado de
+convert_value / parse_to_datetime / to_float_br_us; typed_column, o mesmo da versão antiga (regra
+por célula nos valores distintos). Entradas: casos de borda escritos à mão (BR/US, milhar, datas
+inválidas, espaços, 'T', não ASCII...) e fuzz com fragmentos aleatórios e datas bem formadas com
+componentes aleatórios.
+
+    python -m pytest -q tests
+"""
+
+import random
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import oea_conversoes as conv  # noqa: E402
+
+EDGE_DATES = [
+    "", " ", "nan", "NaN", "None", "null", "-", "x", "01/02/2024", "1/2/2024", " 01/02/2024 ",
+    "31/02/2024", "29/02/2024", "29/02/2023", "29/02/1900", "29/02/2000", "00/01/2024", "01/13/2024",
+    "01/02/2024 10:11", "01/02/2024 7:05", "01/02/2024 10:5", "01/02/2024 10:11:12", "01/02/2024 10:11:5",
+    "01/02/2024 24:00", "01/02/2024 23:60", "01/02/2024 23:59:60", "01/02/2024 99:00",
+    "01/02/2024T10:11", "01/02/2024T", "01/02/2024  10:11", "01/02/2024   10:11", "01/02/2024\t10:11",
+    "2024-03-05", "2024-3-5", "2024-03-05 10:11", "2024-03-05T10:11:12", "2024-03-05 10:1",
+    "2024-03-05 10:11:1", "2024-02-30", "2024-13-01", "0000-01-01", "0001-01-01", "0999-12-31",
+    "9999-12-31 23:59:59", "1899-12-30", "1899-12-29 12:00", "1600-02-29", "1700-02-29",
+    "01/02/24", "2024/03/05", "05.03.2024", "١٢/٠٢/٢٠٢٤", "01/02/2024 10:11 ", "01-02-2024",
+    "2024-03-05 ", "2024-03-05 24:00", "T", "TT", "01/02/2024 10:11:12.5",
+]
+EDGE_NUMS = [
+    "", " ", "nan", "-", "--", "NULL", "0", "12", "-3,5", "1.234,56", "1,234.56", "1.234", "1.2345",
+    "1.234.567", "1.234.567,89", "12.5", "12,5", "R$ 1.234,56", "1 234,56", "abc", "1e5", "1.2.3",
+    ",5", ".5", "-.5", "5.", "5,", "1-2", "-1.000", "1.000-", "١٢٣", "１２", "12%", " 7,0 ",
+    "999999999999999999999", "1" * 400, "0,1", "0.000.001", "1.000a", "1.000.", "+5", "inf", "1_000",
+]
+FRAGMENTS = list("0123456789/-:. ,T") + ["20", "2024", "19", "12", "31", "29", "02", "R$", "x", "١"]
+N_FUZZ = 5_000
+
+
+def fuzz(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 12))) for _ in range(n)]
+
+
+def fuzz_dates(n: int, seed: int = 9):
+    """Datas bem formadas com componentes aleatórios (válidos e inválidos) nos dois formatos."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        y, m, d = rng.randint(0, 9999), rng.randint(0, 13), rng.randint(0, 32)
+        hh, mi, ss = rng.randint(0, 25), rng.randint(0, 61), rng.randint(0, 61)
+        base = f"{d:02d}/{m:02d}/{y:04d}" if rng.random() < 0.5 else f"{y:04d}-{m}-{d}"
+        out.append(rng.choice([base, f"{base} {hh}:{mi:02d}", f"{base}T{hh:02d}:{mi:02d}:{ss:02d}"]))
+    return out
+
+
+CASES = [
+    pytest.param(EDGE_DATES, "date", id="borda-datas"),
+    pytest.param(EDGE_NUMS, "num", id="borda-numeros"),
+    pytest.param(fuzz(N_FUZZ), "date", id="fuzz-datas"),
+    pytest.param(fuzz_dates(N_FUZZ), "date", id="fuzz-datas-bem-formadas"),
+    pytest.param(fuzz(N_FUZZ, seed=8), "num", id="fuzz-numeros"),
+]
+
+
+def same(a, b) -> bool:
+    """Igualdade estrita: mesmo tipo e, para float, mesmos bits."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, float):
+        return np.float64(a).tobytes() == np.float64(b).tobytes()
+    return a == b
+
+
+def old_typed_column(values: pd.Series, kind: str):
+    """typed_column antes do motor por coluna (regra por célula nos valores distintos)."""
+    f = conv.parse_to_datetime if kind == "date" else conv.to_float_br_us
+    codes, uniques = pd.factorize(values.astype(object).fillna(""))
+    out = []
+    for v in uniques:
+        if v == "":
+            out.append(None)
+            continue
+        x = f(v)
+        if x is None:
+            return None
+        out.append(x)
+    try:
+        if kind == "date":
+            parsed = pd.DatetimeIndex(pd.to_datetime(pd.Series(out, dtype=object), errors="raise"))
+        else:
+            parsed = pd.Index(pd.Series(out, dtype="float64"))
+    except (ValueError, OverflowError):
+        return None
+    return pd.Series(parsed.take(codes, allow_fill=True), index=values.index)
+
+
+@pytest.mark.parametrize("values, kind", CASES)
+def test_convert_column_igual_a_convert_value(values, kind):
+    got = conv.convert_column(pd.Series(values, dtype=object), kind).tolist()
+    want = [conv.convert_value(v, kind) for v in values]
+    bad = [(v, g, w) for v, g, w in zip(values, got, want) if not same(g, w)]
+    assert not bad, bad[:10]
+
+
+@pytest.mark.parametrize("values, kind", CASES)
+def test_parts_iguais_a_regra_por_celula(values, kind):
+    uniques = np.array(list(dict.fromkeys(values)), dtype=object)
+    if kind == "date":
+        ok, days, secs = conv.date_parts(uniques)
+        got = [conv.SHEETS_EPOCH + timedelta(days=int(d), seconds=int(s)) if o else None
+               for o, d, s in zip(ok, days, secs)]
+        want = [conv.parse_to_datetime(v) for v in uniques]
+    else:
+        ok, nums = conv.number_parts(uniques)
+        got = [float(x) if o else None for o, x in zip(ok, nums)]
+        want = [conv.to_float_br_us(v) for v in uniques]
+    bad = [(v, g, w) for v, g, w in zip(uniques, got, want)
+           if (g is None) != (w is None) or (g is not None and (g != w if kind == "date" else not same(g, w)))]
+    assert not bad, bad[:10]
+
+
+@pytest.mark.parametrize("values, kind", CASES)
+def test_typed_column_igual_a_versao_antiga(values, kind):
+    # coluna inteira e, para ter casos sem perda, só os valores convertíveis
+    want = [conv.convert_value(v, kind) for v in values]
+    ok_values = [v for v, w in zip(values, want) if v == "" or not same(w, v)]
+    for sample in (values, ok_values):
+        t_new = conv.typed_column(pd.Series(sample, dtype=object), kind)
+        t_old = old_typed_column(pd.Series(sample, dtype=object), kind)
+        assert (t_new is None) == (t_old is None), len(sample)
+        if t_new is not None:
+            assert t_new.equals(t_old), len(sample)
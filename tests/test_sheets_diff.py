@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Sincronização diferencial (oea_sheets.cell_key / row_hashes / diff_blocks): regravar só os trechos
+de diff_blocks sobre a cópia anterior (e limpar a cauda quando a base encolhe) tem de dar a mesma
+grade que a regravação completa — base que encolhe, que cresce, com outro nº de colunas ou igual.
+
+    python -m pytest -q tests
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from oea_sheets import cell_key, diff_blocks, row_hashes  # noqa: E402
+
+
+def make_rows(n: int, n_cols: int, seed: int = 1):
+    rng = random.Random(seed)
+    values = ["", None, 0, 1, 45000, 45000.5, -3.25, "texto", "1", True, "á"]
+    return [[rng.choice(values) for _ in range(n_cols)] for _ in range(n)]
+
+
+def grid(rows, n_cols: int):
+    """Como a planilha devolve a grade: chaves canônicas, sem vazios no fim da linha nem linhas vazias no fim."""
+    out = []
+    for row in rows:
+        keys = [cell_key(v) for v in list(row)[:n_cols]]
+        while keys and keys[-1] == "":
+            keys.pop()
+        out.append(keys)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+def apply_diff(sheet, new, n_cols: int, merge_gap: int = 0):
+    """Regrava só os trechos alterados e limpa a cauda (o que o replicar_bd_mensal faz); devolve os trechos."""
+    blocks = diff_blocks(row_hashes(sheet, n_cols), row_hashes(new, n_cols), merge_gap=merge_gap)
+    sheet = [list(r) for r in sheet] + [[] for _ in range(max(0, len(new) - len(sheet)))]
+    for start, end in blocks:
+        for i in range(start, end):
+            sheet[i] = list(new[i])
+    return sheet[:len(new)], blocks
+
+
+def changed_rows(blocks):
+    return sum(end - start for start, end in blocks)
+
+
+@pytest.mark.parametrize("merge_gap", [0, 3])
+def test_base_igual_nao_regrava_nada(merge_gap):
+    rows = make_rows(200, 6)
+    sheet, blocks = apply_diff(rows, [list(r) for r in rows], 6, merge_gap)
+    assert blocks == []
+    assert grid(sheet, 6) == grid(rows, 6)
+
+
+@pytest.mark.parametrize("merge_gap", [0, 3])
+def test_base_que_encolhe(merge_gap):
+    old = make_rows(200, 6)
+    new = [list(r) for r in old[:150]]
+    new[10][2] = "mudou"
+    sheet, blocks = apply_diff(old, new, 6, merge_gap)
+    assert blocks == [(10, 11)]
+    assert grid(sheet, 6) == grid(new, 6)
+
+
+@pytest.mark.parametrize("merge_gap", [0, 3])
+def test_base_que_cresce(merge_gap):
+    old = make_rows(150, 6)
+    new = [list(r) for r in old] + make_rows(50, 6, seed=2)
+    new[40][0] = "mudou"
+    sheet, blocks = apply_diff(old, new, 6, merge_gap)
+    assert blocks == [(40, 41), (150, 200)]
+    assert grid(sheet, 6) == grid(new, 6)
+
+
+def test_linhas_alteradas_espalhadas_e_merge_gap():
+    old = make_rows(100, 4)
+    new = [list(r) for r in old]
+    for i in (5, 7, 50):
+        new[i][1] = f"mudou {i}"
+    assert diff_blocks(row_hashes(old, 4), row_hashes(new, 4)) == [(5, 6), (7, 8), (50, 51)]
+    sheet, blocks = apply_diff(old, new, 4, merge_gap=1)
+    assert blocks == [(5, 8), (50, 51)]
+    assert grid(sheet, 4) == grid(new, 4)
+
+
+def test_colunas_a_mais_na_base_nova():
+    old = make_rows(100, 4)
+    new = [list(r) + ["nova"] if i % 3 == 0 else list(r) + [""] for i, r in enumerate(old)]
+    sheet, blocks = apply_diff(old, new, 5)
+    assert changed_rows(blocks) == len(range(0, 100, 3))
+    assert grid(sheet, 5) == grid(new, 5)
+
+
+def test_colunas_a_menos_na_base_nova():
+    # com a largura antiga, toda linha que tinha conteúdo nas colunas removidas é regravada
+    old = make_rows(100, 5)
+    new = [list(r[:4]) for r in old]
+    sheet, blocks = apply_diff(old, new, 5)
+    assert changed_rows(blocks) == sum(1 for r in old if cell_key(r[4]) != "")
+    assert grid(sheet, 5) == grid(new, 5)
+    # medindo só as colunas novas, as sobras ficam invisíveis (por isso o replicar_bd_mensal
+    # não usa o diferencial quando há conteúdo além de num_cols)
+    assert diff_blocks(row_hashes(old, 4), row_hashes(new, 4)) == []
+
+
+def test_linha_curta_igual_a_linha_com_vazios_no_fim():
+    assert row_hashes([["a", 1]], 4) == row_hashes([["a", 1, "", None]], 4)
+    assert row_hashes([["a", 1]], 4) != row_hashes([["a", "", 1]], 4)
+
+
+@pytest.mark.parametrize("sent, read_back", [
+    (45000, 45000.0),
+    ("", None),
+    (float("nan"), ""),
+    (-3.25, -3.25),
+    ("texto", "texto"),
+])
+def test_cell_key_valor_enviado_igual_ao_lido(sent, read_back):
+    assert cell_key(sent) == cell_key(read_back)
+
+
+@pytest.mark.parametrize("a, b", [(1, "1"), (True, 1), (0, ""), (45000.5, 45000)])
+def test_cell_key_distingue_valores_diferentes(a, b):
+    assert cell_key(a) != cell_key(b)